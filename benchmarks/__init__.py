@@ -0,0 +1,5 @@
+"""
+end to end benchmarks of the hot paths against the fake services
+
+    python -m benchmarks --students 200 --exercises 10 --output results.json
+"""
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy.pool import NullPool
+
+from benchmarks.measure import run
+from fakes.directory import Directory
+from fakes.serve import serve, server_env
+
+parser = argparse.ArgumentParser(prog="python -m benchmarks", description="benchmarks the hot paths of the server")
+parser.add_argument("--students", type=int, default=200)
+parser.add_argument("--exercises", type=int, default=10)
+parser.add_argument("--pushes", type=int, default=1000, help="pre and post receive hooks each")
+parser.add_argument("--requests", type=int, default=200, help="requests of /courses/list and stats each")
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--database", help="sqlalchemy url, e.g. of postgres, default is a fresh sqlite file")
+parser.add_argument("--port", type=int, default=9000, help="first port of the fake services")
+parser.add_argument("--output", help="file to write the json results to, default is stdout")
+args = parser.parse_args()
+
+directory = Directory(students=args.students)
+os.environ.update(serve(directory, port=args.port))
+# flask sqlalchemy 2.4 cannot open sqlite file urls with sqlalchemy 1.4 (it rewrites the immutable url),
+# so the file is opened by a creator below
+database = args.database or "sqlite://"
+# the server reads its environment on import
+for key, value in server_env(database).items():
+    os.environ.setdefault(key, value)
+
+from server.app import create_app  # noqa: E402
+from server.util.recording import format_payload  # noqa: E402
+
+app = create_app()
+if not args.database:
+    # a connection per thread, the single in-memory connection does not survive concurrent requests
+    path = f"{tempfile.mkdtemp()}/benchmark.sqlite"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "creator": lambda: sqlite3.connect(path, timeout=30, check_same_thread=False),
+        "poolclass": NullPool,
+    }
+course = "2022WS-Benchmark"
+users = directory.users()
+students = [Directory.student(i) for i in range(args.students)]
+local = threading.local()
+
+
+def client(user: str = None):
+    c = app.test_client()
+    if user:
+        with c.session_transaction() as session:
+            session["user"] = users[user]
+    return c
+
+
+def hook_client():
+    if not hasattr(local, "client"):
+        local.client = client()
+    return local.client
+
+
+def check(r, *statuses):
+    if r.status_code not in statuses:
+        raise Exception(f"{r.status_code}: {r.get_data(as_text=True)[:200]}")
+
+
+def setup():
+    r = client("admin").post("/admin/courses/add", json={"name": "Benchmark", "semester": "2022WS",
+                                                         "display_name": "Benchmark", "joinable": "on"})
+    check(r, 302)
+
+
+def join(c):
+    check(c.post("/courses/join", json={"course": course}), 302)
+
+
+def add_exercise(item):
+    c, i = item
+    now = datetime.now()
+    check(c.post(f"/admin/exercises/{course}/add", json={
+        "name": f"exercise-{i:02d}",
+        "start_date": (now - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M"),
+        "end_date": (now + timedelta(days=7)).strftime("%Y-%m-%dT%H:%M"),
+        "points": "10",
+    }), 302)
+
+
+def payload(student: str, files: list) -> str:
+    return format_payload({"user": student, "repo": student, "owner": course, "files": ",".join(files),
+                           "head": "%040x" % random.getrandbits(160)})
+
+
+def pushes():
+    items = []
+    for _ in range(args.pushes):
+        student = random.choice(students)
+        exercise = f"exercise-{random.randrange(max(1, args.exercises)):02d}"
+        # every tenth push touches a readme, which gets rejected
+        files = [f"{exercise}/main.py", f"{exercise}/README.md" if random.random() < 0.1 else f"{exercise}/test.py"]
+        items.append(payload(student, files))
+    return items
+
+
+def pre_receive(data: str):
+    r = hook_client().post("/hooks/gitea-pre-receive", data=data)
+    check(r, 200, 403)
+    return "rejected" if r.status_code == 403 else None
+
+
+def post_receive(data: str):
+    check(hook_client().post("/hooks/gitea-post-receive", data=data), 200)
+
+
+def stats(c):
+    check(c.get(f"/api/course/{course}/exercises/stats", headers={"Authorization": "fake"}), 200, 304)
+
+
+def list_courses(c):
+    check(c.get("/courses/list"), 200)
+
+
+def builds() -> int:
+    return requests.get(f"{os.environ['BUILD_API_URL']}/stats").json()["builds"]
+
+
+results = {}
+started = time.perf_counter()
+setup()
+results["join"] = run([client(student) for student in students], join, args.concurrency)
+results["add_exercise"] = run([(client("admin"), i) for i in range(args.exercises)], add_exercise, args.concurrency)
+hooks = pushes()
+results["pre_receive"] = run(hooks, pre_receive, args.concurrency)
+triggered = builds()
+results["post_receive"] = run(hooks, post_receive, args.concurrency)
+results["post_receive"].outcomes["builds"] = builds() - triggered
+stats_clients = [client() for _ in range(args.requests)]
+results["stats_cold"] = run(stats_clients[:1], stats, 1)
+results["stats"] = run(stats_clients[1:], stats, args.concurrency)
+results["courses_list"] = run([client(random.choice(students)) for _ in range(args.requests)], list_courses,
+                              args.concurrency)
+
+output = json.dumps({
+    "config": {**vars(args), "database": database.split(":")[0]},
+    "seconds": round(time.perf_counter() - started, 3),
+    "results": {name: result.to_dict() for name, result in results.items()},
+}, indent=2)
+if args.output:
+    with open(args.output, "w") as f:
+        f.write(output)
+else:
+    print(output)
+sys.exit(1 if any(result.errors for result in results.values()) else 0)
@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+@dataclass
+class Result:
+    # seconds per call
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    # message of the first error, the others are most likely alike
+    error: str = ""
+    # wall clock seconds of the whole run
+    seconds: float = 0
+    # outcome counts, e.g. rejected pushes
+    outcomes: dict = field(default_factory=dict)
+
+    def count(self, outcome: str):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def to_dict(self) -> dict:
+        milliseconds = [latency * 1000 for latency in self.latencies]
+        return {
+            "count": len(self.latencies),
+            "errors": self.errors,
+            **({"error": self.error} if self.error else {}),
+            "seconds": round(self.seconds, 3),
+            "throughput": round(len(self.latencies) / self.seconds, 2) if self.seconds else 0,
+            "mean_ms": round(sum(milliseconds) / len(milliseconds), 2) if milliseconds else 0,
+            "p50_ms": round(percentile(milliseconds, 50), 2),
+            "p90_ms": round(percentile(milliseconds, 90), 2),
+            "p99_ms": round(percentile(milliseconds, 99), 2),
+            "max_ms": round(max(milliseconds, default=0), 2),
+            **self.outcomes,
+        }
+
+
+def run(calls: list, call: Callable, concurrency: int = 1) -> Result:
+    """
+    runs call(item) for all items with concurrency threads, call returns
+    None on success, an outcome to count, or raises on errors
+    """
+    result = Result()
+
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            outcome = call(item)
+        except Exception as e:
+            outcome = e
+        return time.perf_counter() - start, outcome
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, outcome in executor.map(timed, calls):
+            result.latencies.append(latency)
+            if isinstance(outcome, Exception):
+                result.errors += 1
+                result.error = result.error or str(outcome)
+            elif outcome:
+                result.count(outcome)
+    result.seconds = time.perf_counter() - start
+    return result
@@ -0,0 +1,187 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.measure import Result, percentile
+from fakes.directory import Directory
+from server.util.recording import anonymize, format_payload
+
+# hook -> route of the server
+ROUTES = {"pre-receive": "/hooks/gitea-pre-receive", "post-receive": "/hooks/gitea-post-receive"}
+
+
+def load(path: str) -> list:
+    with open(path, "r") as f:
+        return sorted([json.loads(line) for line in f if line.strip()], key=lambda record: record["time"])
+
+
+def write(records: list, path: str = None):
+    f = open(path, "w") if path else sys.stdout
+    for record in records:
+        f.write(json.dumps(record) + "\n")
+    if path:
+        f.close()
+
+
+def generate(course: str, students: int, exercises: list, pushes: int, minutes: float) -> list:
+    """
+    synthetic last hour before a deadline, pushes get more frequent towards the end
+    """
+    end = time.time()
+    records = []
+    for _ in range(pushes):
+        # density grows quadratically towards the deadline
+        at = end - minutes * 60 * (1 - random.random() ** (1 / 3))
+        student = f"student{random.randrange(students):04d}"
+        exercise = random.choice(exercises)
+        files = [f"{exercise}/main.py"] + ([f"{exercise}/README.md"] if random.random() < 0.05 else [])
+        payload = format_payload({"user": student, "repo": student, "owner": course, "files": ",".join(files),
+                                  "head": "%040x" % random.getrandbits(160)})
+        # gitea calls pre-receive first, post-receive once the push went through
+        records.append({"time": at, "hook": "pre-receive", "payload": payload})
+        records.append({"time": at + 0.5, "hook": "post-receive", "payload": payload})
+    return sorted(records, key=lambda record: record["time"])
+
+
+def remap(records: list, students: int, tutors: int = 1, course: str = None) -> list:
+    """
+    maps the pseudonyms of an anonymized recording to the users of the fakes (see fakes/directory.py),
+    owners of repositories to students and everyone else pushing to tutors, so replayed hooks
+    find enrolled students and their repositories instead of taking the early returns
+    """
+    mapped = {}
+
+    def user(pseudonym: str, owner: bool) -> str:
+        if pseudonym not in mapped:
+            same = [name for name in mapped.values() if name.startswith("student" if owner else "tutor")]
+            mapped[pseudonym] = Directory.student(len(same) % students) if owner else Directory.tutor(len(same) % tutors)
+        return mapped[pseudonym]
+
+    remapped = []
+    for record in records:
+        data = json.loads(record["payload"].replace("\n", ","))
+        if "repo" in data:
+            data["repo"] = user(data["repo"], owner=True)
+        if "user" in data:
+            data["user"] = user(data["user"], owner=False)
+        if course and "owner" in data:
+            data["owner"] = course
+        remapped.append({**record, "payload": format_payload(data)})
+    return remapped
+
+
+def replay(records: list, url: str, rate: float, concurrency: int, build_stats: str = None) -> dict:
+    """
+    sends the records to the server at rate times their recorded pace
+    """
+    local = threading.local()
+
+    def send(record, due):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.monotonic()
+        try:
+            r = local.session.post(url + ROUTES[record["hook"]], data=record["payload"].encode("utf-8"))
+            status = r.status_code
+        except requests.RequestException:
+            status = None
+        return record["hook"], status, time.monotonic() - started, started - due
+
+    builds = requests.get(build_stats).json()["builds"] if build_stats else None
+    first = records[0]["time"] if records else 0
+    start = time.monotonic()
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            due = start + (record["time"] - first) / rate
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(send, record, due))
+    seconds = time.monotonic() - start
+
+    results = {hook: Result(seconds=seconds) for hook in ROUTES}
+    lags = []
+    for future in futures:
+        hook, status, latency, lag = future.result()
+        result = results[hook]
+        result.latencies.append(latency)
+        lags.append(lag)
+        if hook == "pre-receive" and status == 403:
+            result.count("rejected")
+        elif status != 200:
+            result.errors += 1
+
+    report = {
+        "records": len(records),
+        "rate": rate,
+        "seconds": round(seconds, 3),
+        # how late requests were sent compared to the schedule, high values mean too few threads
+        "lag_p99_ms": round(percentile(lags, 99) * 1000, 2),
+        "results": {hook: result.to_dict() for hook, result in results.items()},
+    }
+    if build_stats:
+        report["builds"] = requests.get(build_stats).json()["builds"] - builds
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.replay",
+                                     description="generates, anonymizes and replays recorded gitea hooks "
+                                                 "(see HOOK_RECORD_PATH)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("anonymize", help="pseudonymizes users and file names of a recording")
+    p.add_argument("recording")
+    p.add_argument("--salt", default="")
+    p.add_argument("--output")
+
+    p = commands.add_parser("generate", help="synthetic push storm before a deadline")
+    p.add_argument("--course", required=True)
+    p.add_argument("--students", type=int, default=500)
+    p.add_argument("--exercises", nargs="+", default=["exercise-01"])
+    p.add_argument("--pushes", type=int, default=5000)
+    p.add_argument("--minutes", type=float, default=60)
+    p.add_argument("--output")
+
+    p = commands.add_parser("replay", help="replays a recording against a running server")
+    p.add_argument("recording")
+    p.add_argument("--url", default="http://localhost:5000")
+    p.add_argument("--rate", type=float, default=1, help="multiple of the recorded pace")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--build-stats", help="/stats url of the fake build server, to count triggered builds")
+    p.add_argument("--students", type=int,
+                   help="maps the pseudonyms of an anonymized recording to this many students of the fakes")
+    p.add_argument("--tutors", type=int, default=1, help="tutors of the fakes pushing to others' repositories")
+    p.add_argument("--course", help="course of the fakes the pushes go to, default is the recorded one")
+    p.add_argument("--output")
+
+    args = parser.parse_args()
+    if args.command == "anonymize":
+        records = load(args.recording)
+        for record in records:
+            record["payload"] = anonymize(record["payload"], args.salt)
+        write(records, args.output)
+    elif args.command == "generate":
+        write(generate(args.course, args.students, args.exercises, args.pushes, args.minutes), args.output)
+    else:
+        records = load(args.recording)
+        if args.students:
+            records = remap(records, args.students, args.tutors, args.course)
+        report = json.dumps(replay(records, args.url.rstrip("/"), args.rate, args.concurrency,
+                                   args.build_stats), indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(report)
+        else:
+            print(report)
+
+
+if __name__ == "__main__":
+    main()
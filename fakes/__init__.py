@@ -0,0 +1,8 @@
+"""
+stand-ins for gitea, rocket chat, the auth server and the build server,
+implementing the subset of their apis the server uses, for benchmarking offline
+
+    python -m fakes
+
+starts all of them and prints the environment pointing the server at them
+"""
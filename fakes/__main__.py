@@ -0,0 +1,20 @@
+import argparse
+import time
+
+from fakes.directory import Directory
+from fakes.serve import serve
+
+parser = argparse.ArgumentParser(prog="python -m fakes", description="runs stand-ins of all external services")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=9000, help="first of four consecutive ports")
+parser.add_argument("--students", type=int, default=1000)
+parser.add_argument("--tutors", type=int, default=20)
+args = parser.parse_args()
+
+env = serve(Directory(students=args.students, tutors=args.tutors), args.host, args.port)
+# e.g. eval "$(python -m fakes)" or paste into .env
+for key, value in env.items():
+    print(f"export {key}={value}", flush=True)
+
+while True:
+    time.sleep(3600)
@@ -0,0 +1,29 @@
+from flask import Flask, jsonify
+
+from fakes.behaviour import Behaviour
+from fakes.directory import Directory
+
+
+def create_app(directory: Directory, behaviour: Behaviour) -> Flask:
+    """
+    user api of the auth server (see server/integration/auth_server.py), no oauth
+    """
+    app = Flask("fake_auth")
+    behaviour.apply(app)
+    users = directory.users()
+
+    @app.route("/api/user/<username>", methods=["GET"])
+    def user(username):
+        if username not in users:
+            return "user not found", 404
+        return jsonify(users[username])
+
+    @app.route("/api/users", methods=["GET"])
+    def all_users():
+        return jsonify(users)
+
+    @app.route("/api/admins", methods=["GET"])
+    def admins():
+        return jsonify({username: info for username, info in users.items() if info["role"] == "admin"})
+
+    return app
@@ -0,0 +1,62 @@
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+from flask import Flask, jsonify
+
+
+@dataclass
+class Behaviour:
+    """
+    how a fake service degrades, applied to every request
+    """
+    # seconds added to every request, plus up to jitter seconds
+    latency: float = 0
+    jitter: float = 0
+    # fraction of requests failing with 503
+    error_rate: float = 0
+    # requests per second before answering 429, 0 disables
+    rate_limit: float = 0
+    # token bucket of the rate limit, starts full
+    tokens: float = -1
+    refilled: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @staticmethod
+    def from_env(service: str) -> "Behaviour":
+        """
+        reads FAKE_<SERVICE>_LATENCY, _JITTER, _ERROR_RATE and _RATE_LIMIT,
+        falling back to FAKE_LATENCY, ... for all services
+        """
+
+        def get(name: str) -> float:
+            return float(os.environ.get(f"FAKE_{service.upper()}_{name}", os.environ.get(f"FAKE_{name}", 0)))
+
+        return Behaviour(latency=get("LATENCY"), jitter=get("JITTER"), error_rate=get("ERROR_RATE"),
+                         rate_limit=get("RATE_LIMIT"))
+
+    def limited(self) -> bool:
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if self.tokens < 0:
+                self.tokens = self.rate_limit
+            self.tokens = min(self.rate_limit, self.tokens + (now - self.refilled) * self.rate_limit)
+            self.refilled = now
+            if self.tokens < 1:
+                return True
+            self.tokens -= 1
+            return False
+
+    def apply(self, app: Flask):
+        @app.before_request
+        def degrade():
+            if self.limited():
+                return jsonify({"success": False, "message": "rate limit exceeded"}), 429
+            if self.latency or self.jitter:
+                time.sleep(self.latency + random.random() * self.jitter)
+            if self.error_rate and random.random() < self.error_rate:
+                return jsonify({"success": False, "message": "injected error"}), 503
@@ -0,0 +1,43 @@
+import json
+import threading
+from collections import Counter
+
+from flask import Flask, jsonify
+
+from fakes.behaviour import Behaviour
+
+
+def create_app(behaviour: Behaviour) -> Flask:
+    """
+    build api of the build server (see server/integration/build_server.py),
+    builds finish instantly and succeed, /stats counts what was triggered
+    """
+    app = Flask("fake_build")
+    behaviour.apply(app)
+    builds = Counter()
+    lock = threading.Lock()
+
+    @app.route("/build/<course>/<student>", methods=["GET"])
+    @app.route("/build/<course>/<student>/<exercise>", methods=["GET"])
+    def build(course, student, exercise=""):
+        with lock:
+            builds[(course, student, exercise)] += 1
+        return "build triggered", 200
+
+    @app.route("/logs/<course>/<student>/<exercise>", methods=["GET"])
+    def logs(course, student, exercise):
+        count = builds.get((course, student, exercise))
+        if not count:
+            return "no build", 404
+        # as the build server answers, the steps are json encoded once more (see parse_build of the cli)
+        return jsonify({"failure": False, "logs": json.dumps([
+            {"name": "clone", "failure": False, "logs": [f"build {count} of {exercise} for {student} in {course}"]},
+            {"name": "test", "failure": False, "logs": ["all tests passed"]},
+        ])}), 200
+
+    @app.route("/stats", methods=["GET"])
+    def stats():
+        with lock:
+            return jsonify({"builds": sum(builds.values()), "repositories": len(builds)})
+
+    return app
@@ -0,0 +1,38 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class Directory:
+    """
+    users known to all fake services, student0000, ..., tutor00, ... and admin
+    """
+    students: int = 1000
+    tutors: int = 20
+
+    @staticmethod
+    def student(i: int) -> str:
+        return f"student{i:04d}"
+
+    @staticmethod
+    def tutor(i: int) -> str:
+        return f"tutor{i:02d}"
+
+    def users(self) -> dict:
+        users = {}
+        for i in range(self.students):
+            users[self.student(i)] = self.user(self.student(i), "student", 4000000 + i)
+        for i in range(self.tutors):
+            users[self.tutor(i)] = self.user(self.tutor(i), "tutor", 5000000 + i)
+        users["admin"] = self.user("admin", "admin", 0)
+        return users
+
+    @staticmethod
+    def user(username: str, role: str, matrikelnummer: int) -> dict:
+        # as the auth server answers (and puts into id tokens)
+        return {
+            "sub": username,
+            "name": username.capitalize(),
+            "email": f"{username}@fake.courses.server",
+            "role": role,
+            "matrikelnummer": matrikelnummer,
+        }
@@ -0,0 +1,293 @@
+import base64
+import hashlib
+import itertools
+import threading
+
+from flask import Flask, jsonify, request
+
+from fakes.behaviour import Behaviour
+from fakes.directory import Directory
+
+
+def create_app(directory: Directory, behaviour: Behaviour) -> Flask:
+    """
+    gitea api v1 as used by server/integration/gitea_exercises.py,
+    repositories are plain dicts of file paths to contents, there is no git underneath
+    """
+    app = Flask("fake_gitea")
+    behaviour.apply(app)
+    ids = itertools.count(1)
+    lock = threading.Lock()
+
+    users = {username: {"id": next(ids), "login": username, "full_name": info["name"], "email": info["email"],
+                        "is_admin": info["role"] == "admin", "description": ""}
+             for username, info in directory.users().items()}
+    # name -> settings
+    orgs = {}
+    # (owner, name) -> {"id", "files": {path: bytes}, "collaborators": set, "template", "archived"}
+    repos = {}
+    # id -> {"org", "name", "members": set}
+    teams = {}
+
+    def body() -> dict:
+        return request.get_json(silent=True) or {}
+
+    def error(message: str, status: int):
+        return jsonify({"message": message}), status
+
+    def page(items: list, default_limit: int = 30):
+        # like gitea, lists are paginated even if the client does not ask for it
+        number = max(1, request.args.get("page", 1, type=int))
+        limit = request.args.get("limit", default_limit, type=int)
+        return items[(number - 1) * limit:number * limit]
+
+    def sha(content: bytes) -> str:
+        return hashlib.sha1(content).hexdigest()
+
+    def user_json(login: str) -> dict:
+        return {"id": users.get(login, orgs.get(login, {})).get("id", 0), "login": login, "username": login}
+
+    def repo_json(owner: str, name: str) -> dict:
+        repo = repos[(owner, name)]
+        return {"id": repo["id"], "name": name, "full_name": f"{owner}/{name}", "owner": user_json(owner),
+                "private": True, "template": repo["template"], "archived": repo["archived"],
+                "default_branch": "master", "empty": False}
+
+    def contents_json(path: str, content: bytes) -> dict:
+        return {"name": path.split("/")[-1], "path": path, "sha": sha(content), "type": "file",
+                "size": len(content), "encoding": "base64", "content": base64.b64encode(content).decode("utf-8")}
+
+    def file_json(path: str, content, message: str) -> dict:
+        return {"content": contents_json(path, content) if content is not None else None,
+                "commit": {"sha": sha(f"{path}:{message}".encode("utf-8")), "message": message}}
+
+    # users
+    @app.route("/api/v1/users/<username>", methods=["GET"])
+    def user_get(username):
+        if username not in users:
+            return error("user does not exist", 404)
+        return jsonify(users[username])
+
+    @app.route("/api/v1/admin/users", methods=["GET"])
+    def admin_get_all_users():
+        return jsonify(list(users.values()))
+
+    @app.route("/api/v1/admin/users", methods=["POST"])
+    def admin_create_user():
+        data = body()
+        with lock:
+            if data["username"] in users:
+                return error("user already exists", 422)
+            users[data["username"]] = {"id": next(ids), "login": data["username"],
+                                       "full_name": data.get("full_name", ""), "email": data.get("email", ""),
+                                       "is_admin": False, "description": ""}
+        return jsonify(users[data["username"]]), 201
+
+    @app.route("/api/v1/admin/users/<username>", methods=["PATCH"])
+    def admin_edit_user(username):
+        if username not in users:
+            return error("user does not exist", 404)
+        data = body()
+        with lock:
+            if "admin" in data:
+                users[username]["is_admin"] = bool(data["admin"])
+            if data.get("full_name"):
+                users[username]["full_name"] = data["full_name"]
+        return jsonify(users[username])
+
+    @app.route("/api/v1/user/settings", methods=["PATCH"])
+    def update_user_settings():
+        username = request.headers.get("Sudo") or request.args.get("sudo") or "admin"
+        if username not in users:
+            return error("user does not exist", 404)
+        data = body()
+        with lock:
+            users[username]["full_name"] = data.get("full_name", users[username]["full_name"])
+            users[username]["description"] = data.get("description", users[username]["description"])
+        return jsonify(users[username])
+
+    # organizations and teams
+    @app.route("/api/v1/admin/users/<username>/orgs", methods=["POST"])
+    def admin_create_org(username):
+        data = body()
+        with lock:
+            if data["username"] in orgs or data["username"] in users:
+                return error("organization already exists", 422)
+            orgs[data["username"]] = {"id": next(ids), "username": data["username"],
+                                      "full_name": data.get("full_name", ""), "owner": username}
+        return jsonify(orgs[data["username"]]), 201
+
+    @app.route("/api/v1/orgs/<org>", methods=["DELETE"])
+    def org_delete(org):
+        with lock:
+            if org not in orgs:
+                return error("organization does not exist", 404)
+            if any(owner == org for owner, _ in repos):
+                return error("organization still owns repositories", 422)
+            del orgs[org]
+            for id in [id for id, team in teams.items() if team["org"] == org]:
+                del teams[id]
+        return "", 204
+
+    @app.route("/api/v1/orgs/<org>/teams", methods=["GET"])
+    def org_list_teams(org):
+        if org not in orgs:
+            return error("organization does not exist", 404)
+        return jsonify(page([{"id": id, "name": team["name"]} for id, team in teams.items() if team["org"] == org]))
+
+    @app.route("/api/v1/orgs/<org>/teams", methods=["POST"])
+    def org_create_team(org):
+        if org not in orgs:
+            return error("organization does not exist", 404)
+        data = body()
+        with lock:
+            id = next(ids)
+            teams[id] = {"org": org, "name": data["name"], "members": set()}
+        return jsonify({"id": id, "name": data["name"]}), 201
+
+    @app.route("/api/v1/teams/<int:id>/members/<username>", methods=["PUT", "DELETE"])
+    def team_member(id, username):
+        if id not in teams or username not in users:
+            return error("team or user does not exist", 404)
+        with lock:
+            if request.method == "PUT":
+                teams[id]["members"].add(username)
+            else:
+                teams[id]["members"].discard(username)
+        return "", 204
+
+    # repositories
+    @app.route("/api/v1/orgs/<org>/repos", methods=["GET"])
+    def org_list_repos(org):
+        if org not in orgs:
+            return error("organization does not exist", 404)
+        return jsonify(page([repo_json(owner, name) for owner, name in sorted(repos) if owner == org]))
+
+    @app.route("/api/v1/orgs/<org>/repos", methods=["POST"])
+    def create_org_repo(org):
+        if org not in orgs:
+            return error("organization does not exist", 404)
+        data = body()
+        with lock:
+            if (org, data["name"]) in repos:
+                return error("repository already exists", 409)
+            files = {"README.md": f"# {data['name']}\n".encode("utf-8")} if data.get("auto_init") else {}
+            repos[(org, data["name"])] = {"id": next(ids), "files": files, "collaborators": set(),
+                                          "template": bool(data.get("template")), "archived": False}
+        return jsonify(repo_json(org, data["name"])), 201
+
+    @app.route("/api/v1/repos/<owner>/<repo>/generate", methods=["POST"])
+    def generate_repo(owner, repo):
+        data = body()
+        with lock:
+            if (owner, repo) not in repos:
+                return error("template does not exist", 404)
+            if (data["owner"], data["name"]) in repos:
+                return error("repository already exists", 409)
+            repos[(data["owner"], data["name"])] = {"id": next(ids), "files": dict(repos[(owner, repo)]["files"]),
+                                                    "collaborators": set(), "template": False, "archived": False}
+        return jsonify(repo_json(data["owner"], data["name"])), 201
+
+    @app.route("/api/v1/repos/<owner>/<repo>", methods=["PATCH"])
+    def repo_edit(owner, repo):
+        data = body()
+        with lock:
+            if (owner, repo) not in repos:
+                return error("repository does not exist", 404)
+            if "archived" in data:
+                repos[(owner, repo)]["archived"] = bool(data["archived"])
+            if data.get("name") and data["name"] != repo:
+                repos[(owner, data["name"])] = repos.pop((owner, repo))
+                repo = data["name"]
+        return jsonify(repo_json(owner, repo))
+
+    @app.route("/api/v1/repos/<owner>/<repo>/transfer", methods=["POST"])
+    def repo_transfer(owner, repo):
+        new_owner = body()["new_owner"]
+        with lock:
+            if (owner, repo) not in repos:
+                return error("repository does not exist", 404)
+            if new_owner not in users and new_owner not in orgs:
+                return error("new owner does not exist", 422)
+            repos[(new_owner, repo)] = repos.pop((owner, repo))
+        return jsonify(repo_json(new_owner, repo)), 202
+
+    @app.route("/api/v1/repos/<owner>/<repo>/collaborators/<collaborator>", methods=["PUT", "DELETE"])
+    def repo_collaborator(owner, repo, collaborator):
+        if (owner, repo) not in repos:
+            return error("repository does not exist", 404)
+        if collaborator not in users:
+            return error("user does not exist", 422)
+        with lock:
+            if request.method == "PUT":
+                repos[(owner, repo)]["collaborators"].add(collaborator)
+            else:
+                repos[(owner, repo)]["collaborators"].discard(collaborator)
+        return "", 204
+
+    # files
+    @app.route("/api/v1/repos/<owner>/<repo>/contents/<path:filepath>", methods=["GET", "POST", "PUT", "DELETE"])
+    def contents(owner, repo, filepath):
+        with lock:
+            if (owner, repo) not in repos:
+                return error("repository does not exist", 404)
+            files = repos[(owner, repo)]["files"]
+            if request.method == "GET":
+                if filepath not in files:
+                    return error("file does not exist", 404)
+                return jsonify(contents_json(filepath, files[filepath]))
+
+            data = body()
+            if request.method == "POST":
+                if filepath in files:
+                    return error("file already exists", 422)
+            elif filepath not in files:
+                return error("file does not exist", 404)
+            elif data.get("sha") != sha(files[filepath]):
+                return error("sha does not match", 422)
+
+            if request.method == "DELETE":
+                del files[filepath]
+                return jsonify(file_json(filepath, None, data.get("message", "")))
+            files[filepath] = base64.b64decode(data["content"])
+            return jsonify(file_json(filepath, files[filepath], data.get("message", ""))), \
+                201 if request.method == "POST" else 200
+
+    @app.route("/api/v1/repos/<owner>/<repo>/contents", methods=["POST"])
+    def change_files(owner, repo):
+        # several files in one commit, all or nothing
+        with lock:
+            if (owner, repo) not in repos:
+                return error("repository does not exist", 404)
+            files = repos[(owner, repo)]["files"]
+            changes = body().get("files", [])
+            if any(change.get("operation") == "create" and change["path"] in files for change in changes):
+                return error("file already exists", 422)
+            for change in changes:
+                if change.get("operation") == "delete":
+                    files.pop(change["path"], None)
+                else:
+                    files[change["path"]] = base64.b64decode(change["content"])
+            message = body().get("message", "")
+            commit = {"sha": sha(f"{len(changes)}:{message}".encode("utf-8")), "message": message}
+            return jsonify({"files": [contents_json(change["path"], files[change["path"]]) if change["path"] in files
+                                      else None for change in changes], "commit": commit}), 201
+
+    @app.route("/api/v1/repos/<owner>/<repo>/git/trees/<ref>", methods=["GET"])
+    def get_tree(owner, repo, ref):
+        if (owner, repo) not in repos:
+            return error("repository does not exist", 404)
+        files = repos[(owner, repo)]["files"]
+        directories = {"/".join(path.split("/")[:i]) for path in files for i in range(1, path.count("/") + 1)}
+        entries = sorted([{"path": path, "type": "blob", "mode": "100644", "size": len(content),
+                           "sha": sha(content)} for path, content in files.items()] +
+                         [{"path": path, "type": "tree", "mode": "040000", "size": 0, "sha": sha(path.encode())}
+                          for path in directories], key=lambda entry: entry["path"])
+        number = max(1, request.args.get("page", 1, type=int))
+        per_page = request.args.get("per_page", 1000, type=int)
+        return jsonify({"sha": sha(repr(sorted(files.items())).encode("utf-8")),
+                        "tree": entries[(number - 1) * per_page:number * per_page],
+                        "truncated": number * per_page < len(entries), "page": number,
+                        "total_count": len(entries)})
+
+    return app
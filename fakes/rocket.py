@@ -0,0 +1,140 @@
+import itertools
+import threading
+
+from flask import Flask, jsonify, request
+
+from fakes.behaviour import Behaviour
+from fakes.directory import Directory
+
+
+def create_app(directory: Directory, behaviour: Behaviour) -> Flask:
+    """
+    rest api of rocket chat as used by server/integration/rocket_chat.py,
+    teams with their rooms and members kept in memory
+    """
+    app = Flask("fake_rocket")
+    behaviour.apply(app)
+    users = {username: f"uid-{username}" for username in directory.users()}
+    # team name -> {"room": main room id, "rooms": {room id: name}, "members": {user id: roles}}
+    teams = {}
+    # room id -> name of rooms not (yet) in a team
+    channels = {}
+    ids = itertools.count(1)
+    lock = threading.Lock()
+
+    def data() -> dict:
+        return request.get_json(silent=True) or request.values.to_dict()
+
+    def ok(**kwargs):
+        return jsonify({"success": True, **kwargs})
+
+    def fail(message: str, status: int = 400):
+        return jsonify({"success": False, "error": message}), status
+
+    @app.route("/api/v1/login", methods=["POST"])
+    def login():
+        return jsonify({"status": "success", "data": {"authToken": "fake-token", "userId": "uid-admin",
+                                                      "me": {"_id": "uid-admin", "username": "admin"}}})
+
+    @app.route("/api/v1/users.info", methods=["GET"])
+    def users_info():
+        username = data().get("username")
+        if username not in users:
+            return fail("user not found")
+        return ok(user={"_id": users[username], "username": username})
+
+    @app.route("/api/v1/users.update", methods=["POST"])
+    @app.route("/api/v1/users.delete", methods=["POST"])
+    @app.route("/api/v1/channels.addOwner", methods=["POST"])
+    @app.route("/api/v1/channels.addModerator", methods=["POST"])
+    @app.route("/api/v1/teams.updateRoom", methods=["POST"])
+    def accept():
+        return ok()
+
+    @app.route("/api/v1/teams.create", methods=["POST"])
+    def teams_create():
+        body = data()
+        with lock:
+            if body["name"] in teams:
+                return fail("team exists")
+            room = f"room-{next(ids)}"
+            teams[body["name"]] = {"room": room, "rooms": {room: body["name"]},
+                                   "members": {uid: ["member"] for uid in body.get("members", [])}}
+        return ok(team={"_id": f"team-{next(ids)}", "name": body["name"], "roomId": room})
+
+    @app.route("/api/v1/teams.delete", methods=["POST"])
+    def teams_delete():
+        with lock:
+            if teams.pop(data().get("teamName"), None) is None:
+                return fail("team not found")
+        return ok()
+
+    @app.route("/api/v1/teams.listRooms", methods=["GET"])
+    def teams_list_rooms():
+        team = teams.get(data().get("teamName"))
+        if team is None:
+            return fail("team not found")
+        rooms = [{"_id": rid, "name": name} for rid, name in team["rooms"].items()]
+        return ok(rooms=rooms, total=len(rooms))
+
+    @app.route("/api/v1/teams.addMembers", methods=["POST"])
+    def teams_add_members():
+        body = data()
+        with lock:
+            team = teams.get(body.get("teamName"))
+            if team is None:
+                return fail("team not found")
+            for member in body.get("members", []):
+                team["members"][member["userId"]] = member.get("roles", ["member"])
+        return ok()
+
+    @app.route("/api/v1/teams.members", methods=["GET"])
+    def teams_members():
+        with lock:
+            team = teams.get(data().get("teamName"))
+            if team is None:
+                return fail("team not found")
+            usernames = {uid: username for username, uid in users.items()}
+            members = [{"user": {"_id": uid, "username": usernames.get(uid)}, "roles": roles}
+                       for uid, roles in team["members"].items()]
+        return ok(members=members, count=len(members), offset=0, total=len(members))
+
+    @app.route("/api/v1/teams.removeMember", methods=["POST"])
+    def teams_remove_member():
+        body = data()
+        with lock:
+            team = teams.get(body.get("teamName"))
+            if team is None or team["members"].pop(body.get("userId"), None) is None:
+                return fail("member not found")
+        return ok()
+
+    @app.route("/api/v1/channels.create", methods=["POST"])
+    def channels_create():
+        name = data()["name"]
+        with lock:
+            rid = f"room-{next(ids)}"
+            channels[rid] = name
+        return ok(channel={"_id": rid, "name": name})
+
+    @app.route("/api/v1/channels.delete", methods=["POST"])
+    def channels_delete():
+        rid = data().get("roomId")
+        with lock:
+            channels.pop(rid, None)
+            for team in teams.values():
+                team["rooms"].pop(rid, None)
+        return ok()
+
+    @app.route("/api/v1/teams.addRooms", methods=["POST"])
+    def teams_add_rooms():
+        body = data()
+        with lock:
+            team = teams.get(body.get("teamName"))
+            if team is None:
+                return fail("team not found")
+            for rid in body.get("rooms", []):
+                if rid in channels:
+                    team["rooms"][rid] = channels.pop(rid)
+        return ok()
+
+    return app
@@ -0,0 +1,67 @@
+import logging
+import tempfile
+import threading
+
+from werkzeug.serving import make_server
+
+from fakes import auth, build, gitea, rocket
+from fakes.behaviour import Behaviour
+from fakes.directory import Directory
+
+
+def serve(directory: Directory, host: str = "127.0.0.1", port: int = 9000) -> dict:
+    """
+    starts all fake services on consecutive ports in background threads,
+    returns the environment pointing the server at them
+    """
+    # one line per request drowns everything else when benchmarking
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    apps = {
+        "gitea": gitea.create_app(directory, Behaviour.from_env("gitea")),
+        "rocket": rocket.create_app(directory, Behaviour.from_env("rocket")),
+        "auth": auth.create_app(directory, Behaviour.from_env("auth")),
+        "build": build.create_app(Behaviour.from_env("build")),
+    }
+    urls = {}
+    for i, (name, app) in enumerate(apps.items()):
+        server = make_server(host, port + i, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        urls[name] = f"http://{host}:{port + i}"
+
+    return {
+        "GITEA_LOCAL_URL": urls["gitea"],
+        "GITEA_USERNAME": "admin",
+        "GITEA_PASSWORD": "fake",
+        "ROCKET_URL": urls["rocket"],
+        "ROCKET_USER": "admin",
+        "ROCKET_PASSWORD": "fake",
+        "AUTH_LOCAL_URL": urls["auth"],
+        "AUTH_API_KEY": "fake",
+        "BUILD_API_URL": urls["build"],
+        "BUILD_API_KEY": "fake",
+    }
+
+
+def server_env(database: str) -> dict:
+    """
+    the rest of the environment the server reads on import, for benchmarks and tests
+    """
+    return {
+        "SQLALCHEMY_DATABASE_URI": database,
+        "API_KEY": "fake",
+        "PUBLIC_URL": "http://localhost:5000",
+        "GITEA_URL": "http://localhost:3000",
+        "GITEA_SSH": "ssh://git@localhost:2222",
+        "AUTH_URL": "http://localhost:4000",
+        "AUTH_COOKIE": "fake",
+        "CLIENT_ID": "fake",
+        "CLIENT_SECRET": "fake",
+        "CLI_VERSION": "1",
+        "FERNET_KEY": "3sSxeJ5d1KGYiv9Ri0yB_4Ou2b0HoNRcfO0ouSAzq9c=",
+        "TUTORIAL_POINTS": "10",
+        "TELEGRAM_LOGGING": "false",
+        "DISABLE_SCHEDULER": "true",
+        "CACHE_BACKEND": "local",
+        "METRICS_DIR": tempfile.mkdtemp(),
+        "EXAM_DIR": tempfile.mkdtemp(),
+    }
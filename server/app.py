@@ -7,6 +7,7 @@ from werkzeug.security import gen_salt
 from server.database import database
 from server.env import Env
 from server.error_handling import error_handling
+from server.exercises.scheduler import scheduler
 from server.oauth import init_oauth
 from server.routing.admin.admin import admin_bp
 from server.routing.admin.courses import admin_courses_bp
@@ -19,6 +20,8 @@ from server.routing.cli import cli_bp
 from server.routing.courses import courses_bp
 from server.routing.home import home_bp
 from server.routing.hooks import hooks_bp
+from server.util.admission import admission
+from server.util.metrics import metrics
 
 
 def create_app():
@@ -36,8 +39,17 @@ def create_app():
     @app.before_first_request
     def create_tables():
         database.alchemy.create_all()
+        # e.g. the job columns added after the job table was deployed
+        database.add_missing_columns()
+        # runs in every worker after uwsgi forked them
+        database.listen()
+        if not Env.get_bool("DISABLE_SCHEDULER", required=False):
+            scheduler.start(app)
 
-    database.alchemy.init_app(app)
+    database.init_app(app)
+    metrics.init_app(app)
+    # after metrics, so the time spent waiting for admission is measured too
+    admission.init_app(app)
 
     # add routers
     app.register_blueprint(home_bp)
@@ -1,6 +1,26 @@
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+from flask import g, has_app_context, request
 from flask_sqlalchemy import Model, SQLAlchemy, BaseQuery
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeMeta
 
+from server.env import Env
+
+logger = logging.getLogger(__name__)
+
 
 class BaseQueryExtension(BaseQuery):
     """
@@ -30,6 +50,22 @@ class BaseQueryExtension(BaseQuery):
         true when models exists
         """
         self.filter_by(**kwargs).delete()
+        # bulk deletes bypass the flush, so record them here
+        model = self.column_descriptions[0]["entity"]
+        if model.__change_keys__:
+            self.session.info.setdefault("changes", []).append(model.describe_change(kwargs))
+
+    def insert_missing(self, *rows: dict):
+        """
+        inserts the rows, skipping those conflicting with a unique constraint
+        (e.g. inserted by another worker meanwhile) instead of failing
+        """
+        model = self.column_descriptions[0]["entity"]
+        dialect = postgresql if self.session.get_bind().dialect.name == "postgresql" else sqlite
+        self.session.execute(dialect.insert(model.__table__).values(list(rows)).on_conflict_do_nothing())
+        # bulk inserts bypass the flush too
+        if model.__change_keys__:
+            self.session.info.setdefault("changes", []).extend(model.describe_change(row) for row in rows)
 
 
 class BaseModel(Model):
@@ -40,12 +76,109 @@ class BaseModel(Model):
     # prevents "unresolved reference" warnings
     query: BaseQueryExtension
 
+    # columns naming what a change of this model affects,
+    # changes of models without any are not published
+    __change_keys__ = ()
+
     def to_dict(self) -> dict:
         """
         used in templates
         """
         return {key: self.__dict__[key] for key in sorted(self.__dict__.keys()) if not key.startswith('_')}
 
+    @classmethod
+    def describe_change(cls, values: dict) -> dict:
+        """
+        the change notification published for the given column values
+        """
+        return {"table": cls.__tablename__, **{key: values[key] for key in cls.__change_keys__ if key in values}}
+
+
+class SQLAlchemyExtension(SQLAlchemy):
+    """
+    calls on_engine with every engine flask sql alchemy creates, which happens on first use
+    (i.e. in the uwsgi workers, not in the master)
+    """
+
+    def __init__(self, on_engine: Callable, **kwargs):
+        self.on_engine = on_engine
+        super().__init__(**kwargs)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        self.on_engine(engine)
+        return engine
+
+
+class LocalBroker:
+    """
+    in-process stand-in for postgres notifications, every database
+    of this process receives what any of them publishes (e.g. for tests)
+    """
+    listeners: list = []
+
+    def publish(self, payload: str):
+        for listener in list(self.listeners):
+            listener(payload)
+
+    def listen(self, callback: Callable[[str], None]):
+        self.listeners.append(callback)
+
+
+class PostgresBroker:
+    """
+    publishes changes via NOTIFY, listens in a background thread
+    """
+    channel = "courses_server_changes"
+
+    def __init__(self, get_engine: Callable):
+        # the engine is created lazily, by the first request of a worker
+        self.get_engine = get_engine
+
+    def publish(self, payload: str):
+        with self.get_engine().begin() as connection:
+            connection.execute(text("SELECT pg_notify(:channel, :payload)"),
+                               {"channel": self.channel, "payload": payload})
+
+    def listen(self, callback: Callable[[str], None]):
+        threading.Thread(target=self.__listen, args=(callback,), daemon=True).start()
+
+    def __listen(self, callback: Callable[[str], None]):
+        while True:
+            try:
+                connection = self.get_engine().raw_connection()
+                # keep this connection out of the pool, it blocks forever
+                connection.detach()
+                connection = connection.connection
+                connection.autocommit = True
+                connection.cursor().execute(f"LISTEN {self.channel}")
+                while True:
+                    if select.select([connection], [], [], 60) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        callback(connection.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("lost connection listening for database changes")
+                time.sleep(5)
+
+
+@dataclass
+class QueryLog:
+    """
+    statements executed while recording, e.g. in a request
+    """
+    count: int = 0
+    # seconds
+    time: float = 0
+    statements: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int) -> dict:
+        """
+        statements executed at least threshold times, most likely a query per item of a list (n+1)
+        """
+        return {statement: count for statement, count in self.statements.most_common() if count >= threshold}
+
 
 class Database:
     """
@@ -55,8 +188,182 @@ class Database:
     Model: DeclarativeMeta
 
     def __init__(self):
-        self.sql_alchemy: SQLAlchemy = SQLAlchemy(query_class=BaseQueryExtension, model_class=BaseModel)
+        self.sql_alchemy: SQLAlchemy = SQLAlchemyExtension(self.__instrument, query_class=BaseQueryExtension,
+                                                           model_class=BaseModel)
         self.Model = self.sql_alchemy.Model
+        self.broker = None
+        # identifies this process, it does not need to handle its own notifications twice
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self.subscribers: List[Callable[[dict], None]] = []
+        # query logs of max_queries blocks of the current thread
+        self.recorders = threading.local()
+        self.n_plus_one_threshold = Env.get_int("SQL_N_PLUS_ONE_THRESHOLD", required=False, default=5)
+
+        # only sessions of this database (its sessionmaker has its own session class), not of other instances
+        session = self.sql_alchemy.session
+        event.listen(session, "after_flush", self.__record_changes)
+        event.listen(session, "after_commit", self.__publish_changes)
+        event.listen(session, "after_soft_rollback", self.__discard_changes)
+
+    def init_app(self, app):
+        self.sql_alchemy.init_app(app)
+        if make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name() == "postgresql":
+            self.broker = PostgresBroker(lambda: self.sql_alchemy.get_engine(app))
+        else:
+            self.broker = LocalBroker()
+
+        # reporting is for development, production answers without it
+        if not Env.get_bool("SQL_DEBUG", required=False):
+            return
+
+        @app.after_request
+        def report_queries(response):
+            log = self.query_log
+            repeated = log.repeated(self.n_plus_one_threshold)
+            if repeated:
+                logger.warning("probable n+1 queries in %s: %s", request.endpoint, "; ".join(
+                    f"{count}x {' '.join(statement.split())}" for statement, count in repeated.items()
+                ))
+            response.headers["X-SQL-Queries"] = f"count={log.count}; time={log.time * 1000:.1f}ms; " \
+                                                f"repeated={sum(repeated.values())}"
+            return response
+
+    def __instrument(self, engine):
+        event.listen(engine, "before_cursor_execute", self.__start_query)
+        event.listen(engine, "after_cursor_execute", self.__record_query)
+        event.listen(engine, "handle_error", self.__discard_query)
+
+    def add_missing_columns(self):
+        """
+        adds columns of models missing in existing tables, which create_all leaves alone,
+        new columns need to be nullable or have a scalar default
+        """
+        engine = self.sql_alchemy.engine
+        inspector = inspect(engine)
+        with engine.begin() as connection:
+            for table in self.Model.metadata.sorted_tables:
+                if not inspector.has_table(table.name):
+                    continue
+                existing = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                    if column.default is not None and column.default.is_scalar:
+                        ddl += f" DEFAULT {column.default.arg!r}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                    logger.info("adding column %s.%s", table.name, column.name)
+                    connection.execute(text(ddl))
+
+    def listen(self):
+        """
+        starts receiving changes of other processes, call after forking workers
+        """
+        self.broker.listen(self.__receive)
+
+    def on_change(self, f: Callable[[dict], None]):
+        """
+        registers f to be called with every committed change of a watched model
+        """
+        self.subscribers.append(f)
+        return f
+
+    @staticmethod
+    def __record_changes(session, _):
+        changes = session.info.setdefault("changes", [])
+        for instance in [*session.new, *session.dirty, *session.deleted]:
+            if getattr(instance, "__change_keys__", ()):
+                changes.append(instance.describe_change(
+                    {key: getattr(instance, key) for key in instance.__change_keys__}
+                ))
+
+    @staticmethod
+    def __discard_changes(session, _):
+        session.info.pop("changes", None)
+
+    def __publish_changes(self, session):
+        changes = session.info.pop("changes", [])
+        if not changes:
+            return
+        # drop duplicates, keeping the order
+        changes = list({json.dumps(change, sort_keys=True): change for change in changes}.values())
+        # handle own changes right away, so the next request of this process sees them
+        self.__dispatch(changes)
+        if self.broker is None:
+            return
+        # notification payloads are limited to 8000 bytes
+        for i in range(0, len(changes), 50):
+            try:
+                self.broker.publish(json.dumps({"origin": self.origin, "changes": changes[i:i + 50]}))
+            except Exception:
+                # the changes are committed already, other workers catch up once their caches expire
+                logger.exception("failed to publish database changes")
+
+    def __receive(self, payload: str):
+        message = json.loads(payload)
+        if message["origin"] != self.origin:
+            self.__dispatch(message["changes"])
+
+    def __dispatch(self, changes: list):
+        for change in changes:
+            for subscriber in self.subscribers:
+                try:
+                    subscriber(change)
+                except Exception:
+                    logger.exception("failed to handle database change %s", change)
+
+    @staticmethod
+    def __start_query(connection, *_):
+        connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @staticmethod
+    def __discard_query(context):
+        if context.connection is not None and context.connection.info.get("query_start"):
+            context.connection.info["query_start"].pop()
+
+    def __record_query(self, connection, _, statement, *__):
+        elapsed = time.perf_counter() - connection.info["query_start"].pop()
+        logs = list(getattr(self.recorders, "logs", []))
+        if has_app_context():
+            logs.append(self.query_log)
+        for log in logs:
+            log.count += 1
+            log.time += elapsed
+            log.statements[statement] += 1
+
+    @property
+    def query_log(self) -> QueryLog:
+        """
+        statements executed in the current request (or app context)
+        """
+        if "query_log" not in g:
+            g.query_log = QueryLog()
+        return g.query_log
+
+    @property
+    def queries(self) -> int:
+        """
+        number of statements executed in the current request
+        """
+        return self.query_log.count if has_app_context() else 0
+
+    @contextmanager
+    def max_queries(self, limit: int):
+        """
+        fails if the block executes more than limit statements, for tests of endpoints:
+        with database.max_queries(10):
+            client.get("/courses/list")
+        """
+        log = QueryLog()
+        logs = self.recorders.__dict__.setdefault("logs", [])
+        logs.append(log)
+        try:
+            yield log
+        finally:
+            logs.remove(log)
+        assert log.count <= limit, f"executed {log.count} statements, at most {limit} expected:\n" + \
+                                   "\n".join(f"{count}x {statement}" for statement, count in log.statements.items())
 
     def __iadd__(self, other):
         self.sql_alchemy.session.add(other)
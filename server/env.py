@@ -21,8 +21,8 @@ class Env:
         return Env.get(key, "False", required).lower() in ('true', '1', 't')
 
     @staticmethod
-    def get_int(key: str, required: bool = True):
+    def get_int(key: str, required: bool = True, default: int = None):
         try:
-            return int(Env.get(key, required=required))
-        except ValueError:
-            return None
+            return int(Env.get(key, default, required=required))
+        except (TypeError, ValueError):
+            return default
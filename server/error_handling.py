@@ -1,11 +1,21 @@
+import hashlib
+import os
+import queue
+import threading
+import time
 import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
 
 from authlib.integrations.base_client import MismatchingStateError, OAuthError
-from flask import session
+from flask import session, has_request_context
+from sqlalchemy.exc import IntegrityError
 from telegram import Bot
 from werkzeug.exceptions import NotFound
 from werkzeug.utils import redirect
 
+from server.database import database
 from server.env import Env
 
 if Env.get_bool("TELEGRAM_LOGGING", required=False):
@@ -31,20 +41,176 @@ def error_handling(app):
             send_error(error)
 
 
+@dataclass
+class Report:
+    fingerprint: str
+    name: str
+    message: str
+    text: str
+    count: int = 1
+
+
+@dataclass
+class Reporter:
+    """
+    sends error reports to telegram from a background thread, so failing requests only pay for an enqueue
+
+    reports with the same exception type and stack are merged, bursts are sent as one digest
+    and at most rate messages are sent per minute, everything else waits for the next digest.
+    bursts of errors reported before are only counted and sent as a summary every summary seconds
+    """
+    # seconds to collect further reports after the first one of a burst
+    window: int = field(default_factory=lambda: Env.get_int("TELEGRAM_BATCH_SECONDS", required=False, default=5))
+    rate: int = field(default_factory=lambda: Env.get_int("TELEGRAM_RATE_PER_MINUTE", required=False, default=10))
+    # reports already sent within this many seconds are only counted
+    dedupe: int = field(default_factory=lambda: Env.get_int("TELEGRAM_DEDUPE_SECONDS", required=False, default=600))
+    summary: int = field(default_factory=lambda: Env.get_int("TELEGRAM_SUMMARY_SECONDS", required=False,
+                                                             default=3600))
+    size: int = 1000
+    dropped: int = 0
+    reports: Optional[queue.Queue] = None
+    pid: Optional[int] = None
+    sent: deque = field(default_factory=deque)
+    reported: dict = field(default_factory=dict)
+    # fingerprint -> report of the known errors since the last summary
+    known: dict = field(default_factory=dict)
+    summarized: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def report(self, report: Report):
+        # threads do not survive forking into workers
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.reports = queue.Queue(maxsize=self.size)
+                    self.sent, self.reported, self.known = deque(), {}, {}
+                    self.summarized = time.monotonic()
+                    threading.Thread(target=self.__loop, daemon=True).start()
+                    self.pid = os.getpid()
+        try:
+            self.reports.put_nowait(report)
+        except queue.Full:
+            self.dropped += 1
+
+    def __loop(self):
+        while True:
+            try:
+                report = self.reports.get(timeout=max(0, self.summarized + self.summary - time.monotonic()))
+                pending = {}
+                self.__collect(pending, report, time.monotonic() + self.window)
+                self.__collect(pending, None, self.__next_slot())
+                self.__send(self.__digest(pending))
+            except queue.Empty:
+                pass
+            if time.monotonic() >= self.summarized + self.summary:
+                self.__send(self.__summary())
+
+    def __send(self, text: Optional[str]):
+        if not text:
+            return
+        try:
+            bot.sendMessage(chat_id=Env.get("TELEGRAM_CHAT_ID"), text=text)
+        except Exception:
+            traceback.print_exc()
+        self.sent.append(time.monotonic())
+
+    def __collect(self, pending: dict, report: Optional[Report], until: float):
+        while True:
+            if report is not None:
+                if report.fingerprint in pending:
+                    pending[report.fingerprint].count += 1
+                else:
+                    pending[report.fingerprint] = report
+            remaining = until - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                report = self.reports.get(timeout=remaining)
+            except queue.Empty:
+                return
+
+    def __next_slot(self) -> float:
+        now = time.monotonic()
+        while self.sent and self.sent[0] < now - 60:
+            self.sent.popleft()
+        if len(self.sent) < self.rate:
+            return now
+        return self.sent[0] + 60
+
+    def __digest(self, pending: dict) -> Optional[str]:
+        now = time.monotonic()
+        reports = sorted(pending.values(), key=lambda report: -report.count)
+        fresh = [report for report in reports if self.reported.get(report.fingerprint, 0) < now - self.dedupe]
+        self.reported = {fingerprint: at for fingerprint, at in self.reported.items() if at >= now - self.dedupe}
+        for report in reports:
+            self.reported[report.fingerprint] = now
+
+        if not fresh:
+            # nothing new, counted for the next summary
+            for report in reports:
+                if report.fingerprint in self.known:
+                    self.known[report.fingerprint].count += report.count
+                else:
+                    self.known[report.fingerprint] = report
+            return None
+        if len(reports) == 1:
+            text = reports[0].text
+            if reports[0].count > 1:
+                text += f"\n(occurred {reports[0].count} times)"
+        else:
+            text = f"ERROR DIGEST of COURSE SERVER: {sum(report.count for report in reports)} errors\n\n"
+            text += "".join(f"{report.count}x {report.name}: {report.message}"
+                            f"{'' if report in fresh else ' (reported before)'}\n" for report in reports)
+            if fresh:
+                text += f"\nMost frequent new error:\n\n{fresh[0].text}"
+        if self.dropped:
+            text += f"\n({self.dropped} reports dropped, queue was full)"
+            self.dropped = 0
+        # telegram rejects longer messages
+        return text[:4000]
+
+    def __summary(self) -> Optional[str]:
+        reports = sorted(self.known.values(), key=lambda report: -report.count)
+        self.known, self.summarized = {}, time.monotonic()
+        if not reports and not self.dropped:
+            return None
+        text = f"ERROR SUMMARY of COURSE SERVER: {sum(report.count for report in reports)} errors reported before " \
+               f"occurred again in the last {self.summary // 60} minutes\n\n"
+        text += "".join(f"{report.count}x {report.name}: {report.message}\n" for report in reports)
+        if self.dropped:
+            text += f"\n({self.dropped} reports dropped, queue was full)"
+            self.dropped = 0
+        return text[:4000]
+
+
+reporter = Reporter()
+
+
 def send_error(exception: Exception):
+    if exception.__traceback__ is not None:
+        frames = traceback.extract_tb(exception.__traceback__)
+        # the same error raised at the same place, whatever the message
+        identity = ""
+    else:
+        # never raised (e.g. send_error(Exception("..."))), where it got reported and what it says
+        frames = traceback.extract_stack()[:-1]
+        identity = str(exception)
     text = f"""ERROR occurred on COURSE SERVER
 
-Logged in user: {session.get("user")}
+Logged in user: {session.get("user") if has_request_context() else None}
 
 Error: {type(exception).__name__}
 Message: {exception}
 
 Stacktrace:
-{''.join(traceback.format_tb(exception.__traceback__))}
+{''.join(traceback.format_list(frames))}
 """
     print(text)
     if Env.get_bool("TELEGRAM_LOGGING", required=False):
-        bot.sendMessage(chat_id=Env.get("TELEGRAM_CHAT_ID"), text=text)
+        stack = [(frame.filename, frame.lineno) for frame in frames]
+        fingerprint = hashlib.sha1(f"{type(exception).__name__}:{identity}:{stack}".encode("utf-8")).hexdigest()
+        reporter.report(Report(fingerprint=fingerprint, name=type(exception).__name__,
+                               message=str(exception)[:200], text=text))
 
 
 def try_except(try_call, catch_call=None):
@@ -52,13 +218,17 @@ def try_except(try_call, catch_call=None):
     try:
         try_call()
         return True
+    except IntegrityError:
+        # duplicates are expected (e.g. concurrent joins), the caller handles them by the result,
+        # but the failed transaction has to go and what try_call did elsewhere is undone all the same
+        database.session.rollback()
     except Exception as exception:
         send_error(exception)
         traceback.format_exc()
-        if catch_call is not None:
-            try:
-                catch_call()
-            except Exception as exception:
-                traceback.format_exc()
-                send_error(exception)
+    if catch_call is not None:
+        try:
+            catch_call()
+        except Exception as exception:
+            traceback.format_exc()
+            send_error(exception)
     return False
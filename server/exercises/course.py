@@ -8,6 +8,7 @@ from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 
 from server.database import database
+from server.env import Env
 from server.error_handling import try_except, send_error
 from server.exercises.models import (
     CourseEntity,
@@ -17,15 +18,51 @@ from server.exercises.models import (
     ExerciseEntity,
     StudentExerciseEntity,
     TutorialParticipation,
+    StudentRepositoryEntity,
+    JobEntity,
 )
 from server.exercises.options import (
     CreateCourseOption,
     AddTutorOption,
     CreateExerciseOption,
 )
+from server.integration import aio
 from server.integration.auth_server import auth
 from server.integration.gitea_exercises import gitea_exercises
 from server.integration.rocket_chat import rocket
+from server.util.cache import Cache, stats_cache
+
+# canonical (name, semester) of course strings, as typed in urls
+courses_cache = Cache("courses", ttl=3600)
+# enrollment role of users per course ("" if not enrolled)
+roles_cache = Cache("roles", ttl=3600)
+# names of exercises students may push to per course, expires at the next start or end
+pending_cache = Cache("pending", ttl=3600)
+
+
+@database.on_change
+def invalidate_caches(change: dict):
+    table = change["table"]
+    if table == "course":
+        courses_cache.invalidate()
+        if "semester" in change and "name" in change:
+            course = f"{change['semester']}-{change['name']}"
+            stats_cache.invalidate(course)
+            roles_cache.invalidate(course)
+        return
+
+    course = change.get("course")
+    if course is None:
+        return
+    if table in ("student", "exercise", "student_exercise"):
+        stats_cache.invalidate(course)
+    if table == "exercise":
+        pending_cache.delete(course)
+    if table in ("student", "tutor"):
+        if "username" in change:
+            roles_cache.delete(change["username"], scope=course)
+        else:
+            roles_cache.invalidate(course)
 
 
 @dataclass
@@ -77,6 +114,8 @@ class Course:
                         TutorStudentEntity.query.delete_by(course=str(self))
                         ExerciseEntity.query.delete_by(course=str(self))
                         StudentExerciseEntity.query.delete_by(course=str(self))
+                        StudentRepositoryEntity.query.delete_by(course=str(self))
+                        JobEntity.query.delete_by(course=str(self))
             else:
                 return f"failed to remove {str(self)} in rocket"
         else:
@@ -109,12 +148,20 @@ class Course:
         return self.exists and self.entity.restricted
 
     def get_role(self, username: str, is_admin=False):
-        if self.has_student(username):
-            return "student"
-        elif self.has_tutor(username):
-            return "tutor"
-        elif self.entity.owner == username:
-            return "owner"
+        role = roles_cache.get(username, scope=str(self))
+        if role is None:
+            if self.has_student(username):
+                role = "student"
+            elif self.has_tutor(username):
+                role = "tutor"
+            elif self.entity.owner == username:
+                role = "owner"
+            else:
+                role = ""
+            roles_cache.set(username, role, scope=str(self))
+
+        if role:
+            return role
         elif is_admin or auth.is_admin(username):
             return "admin"
 
@@ -149,10 +196,9 @@ class Course:
                                     email=info["email"],
                                     matrikelnummer=info["matrikelnummer"],
                                 )
-                        except IntegrityError as e:
+                        except IntegrityError:
                             # if student entity exist dont care
-                            send_error(e)
-                            pass
+                            database.session.rollback()
                         # else:
                         #     return f"failed to activate {student} in drone"
                     else:
@@ -164,6 +210,82 @@ class Course:
         else:
             return f"failed to retrieve information about {student} from auth server"
 
+    def enroll_students(self, roster: list, matrikelnummer: bool = False) -> dict:
+        """
+        add_student for a whole roster of usernames (or matrikelnummern), batching the calls to auth, rocket
+        and gitea, returns an error per roster entry (None if enrolled)
+        """
+        users = auth.get_users() or {}
+        if matrikelnummer:
+            by_matrikelnummer = {str(info.get("matrikelnummer")): info for info in users.values()}
+            infos = {entry: by_matrikelnummer.get(str(entry).strip()) for entry in roster}
+        else:
+            infos = {entry: users.get(entry) for entry in roster}
+            missing = [entry for entry, info in infos.items() if info is None]
+            if missing:
+                async def user_info(username: str):
+                    try:
+                        return await aio.auth.get_user_info(username)
+                    except Exception:
+                        return None
+
+                infos.update(zip(missing, aio.loop.map(user_info, missing)))
+
+        enrolled = {student.username: "student" for student in self.students}
+        enrolled.update({tutor.username: "tutor" for tutor in self.tutors})
+        enrolled[self.entity.owner] = "owner"
+        report, students = {}, {}
+        for entry, info in infos.items():
+            if not info:
+                report[entry] = f"failed to retrieve information about {entry} from auth server"
+            elif info["sub"] in enrolled or info["role"] == "admin":
+                report[entry] = f"failed to add {info['sub']}, is {enrolled.get(info['sub'], 'admin')}"
+            else:
+                students[info["sub"]] = info
+        if not students:
+            return report
+
+        # undone as in add_student, rocket if rocket fails, both if gitea fails
+        if not try_except(
+            lambda: rocket.add_students(str(self), list(students)),
+            lambda: [rocket.remove_student(str(self), student) for student in students],
+        ):
+            report.update({entry: "failed to add student in rocket" for entry in roster if entry not in report})
+            return report
+        errors = gitea_exercises.add_students(str(self), list(students))
+        for student, error in errors.items():
+            if error:
+                try_except(lambda: gitea_exercises.remove_student(str(self), student))
+                try_except(lambda: rocket.remove_student(str(self), student))
+                del students[student]
+
+        entities = [StudentEntity(course=str(self), username=student, name=info["name"], email=info["email"],
+                                  matrikelnummer=info["matrikelnummer"]) for student, info in students.items()]
+        entities += [TutorStudentEntity(tutor="no_tutor", student=student, course=str(self))
+                     for student in students if not student.startswith("test")]
+        try:
+            with database:
+                database.session.add_all(entities)
+        except IntegrityError:
+            # some joined meanwhile, fall back to the one by one inserts of add_student,
+            # which leave the rows of those as they are
+            database.session.rollback()
+            for student, info in students.items():
+                self.assign_tutor(student)
+                try:
+                    with database as db:
+                        db += StudentEntity(course=str(self), username=student, name=info["name"],
+                                            email=info["email"], matrikelnummer=info["matrikelnummer"])
+                except IntegrityError:
+                    database.session.rollback()
+                if not self.has_student(student):
+                    errors[student] = f"failed to add {student} to the database"
+
+        for entry, info in infos.items():
+            if entry not in report:
+                report[entry] = errors.get(info["sub"])
+        return report
+
     def remove_student(self, student) -> Optional[str]:
         if self.has_student(student):
             try:
@@ -184,6 +306,9 @@ class Course:
                     StudentExerciseEntity.query.delete_by(
                         course=str(self), student=student
                     )
+                    StudentRepositoryEntity.query.delete_by(
+                        course=str(self), student=student
+                    )
             except:
                 pass
 
@@ -230,10 +355,9 @@ class Course:
                                     description=options.description,
                                     email=info["email"],
                                 )
-                        except IntegrityError as e:
-                            # if he somehow exists
-                            send_error(e)
-                            pass
+                        except IntegrityError:
+                            # if they somehow exist
+                            database.session.rollback()
                         # first ever tutor, assign all students
                         if len(self.tutors) == 1:
                             for student in self.students:
@@ -246,10 +370,9 @@ class Course:
                                             student=student.username,
                                             course=str(self),
                                         )
-                                except IntegrityError as e:
+                                except IntegrityError:
                                     # student already had tutor
-                                    send_error(e)
-                                    pass
+                                    database.session.rollback()
                     else:
                         return f"failed to add {tutor} in gitea"
                 else:
@@ -296,17 +419,16 @@ class Course:
             #     if tutor not in distribution.keys():
             #         distribution[tutor] = 0
 
-            with database as db:
-                try:
+            try:
+                with database as db:
                     db += TutorStudentEntity(
                         tutor="no_tutor",
                         student=student,
                         course=str(self),
                     )
-                except IntegrityError as e:
-                    # student already got some tutor
-                    send_error(e)
-                    pass
+            except IntegrityError:
+                # student already got some tutor, fails on commit
+                database.session.rollback()
 
     def unassign_tutor(self, student: str):
         with database:
@@ -346,6 +468,16 @@ class Course:
     def get_tutor_student_names(self, tutor: str):
         return [r.student for r in self.get_tutor_students(tutor)]
 
+    @property
+    def tutor_student_names(self) -> dict:
+        """
+        names of assigned students by tutor, in one query
+        """
+        names = {}
+        for r in TutorStudentEntity.query.many(course=str(self)):
+            names.setdefault(r.tutor, []).append(r.student)
+        return names
+
     def get_student_tutor(self, student: str):
         r = TutorStudentEntity.query.one(course=str(self), student=student)
         if not r:
@@ -400,7 +532,8 @@ class Course:
                         lambda: rocket.add_exercise(str(self), exercise),
                         lambda: rocket.remove_exercise(str(self), exercise),
                     ):
-                        if try_except(
+                        # published to the repositories once it starts, see scheduler
+                        if self.publishes_later(options.start) or try_except(
                             lambda: gitea_exercises.add_exercise(
                                 str(self), exercise, self.student_names, options
                             ),
@@ -424,6 +557,7 @@ class Course:
                                     end=options.end,
                                     points=options.points,
                                 )
+                            self.schedule_exercise(exercise)
                         else:
                             return f"could not create {exercise} in gitea"
                     else:
@@ -435,6 +569,60 @@ class Course:
         else:
             return f"exercise with name {exercise} already exists"
 
+    def import_exercises(self, plan: dict) -> Optional[str]:
+        """
+        add_exercise for a whole semester plan (name -> options), checks all exercises before adding any,
+        publishes the started ones with a single commit per repository. exercises imported before with the
+        same dates and points are skipped, so a plan can be imported again
+        """
+        display_name = self.entity.display_name
+        existing = {exercise.name: exercise for exercise in self.exercises}
+        errors = []
+        for exercise, options in list(plan.items()):
+            options.course_name = display_name
+            if exercise in existing:
+                e = existing[exercise]
+                if (e.start, e.end, e.points) == (options.start, options.end, options.points):
+                    del plan[exercise]
+                else:
+                    errors.append(f"exercise with name {exercise} already exists with other dates or points")
+            elif " " in exercise:
+                errors.append(f"{exercise} has spaces in it. uncool bro.")
+            elif options.start > options.end:
+                errors.append(f"{exercise} starts after it ends")
+        if errors:
+            return "\n".join(errors)
+        if not plan:
+            return None
+
+        if not try_except(
+            lambda: rocket.add_exercises(str(self), list(plan)),
+            lambda: [rocket.remove_exercise(str(self), exercise) for exercise in plan],
+        ):
+            return "could not create the exercises in rocket"
+
+        # the others are published once they start, see scheduler
+        now = datetime.now()
+        started = {exercise: options for exercise, options in plan.items() if not self.publishes_later(options.start)}
+        students = self.student_names
+        if started and not try_except(
+            lambda: gitea_exercises.add_exercises(str(self), started, students),
+            lambda: [
+                [gitea_exercises.delete_exercise(str(self), display_name, exercise, students) for exercise in started],
+                [rocket.remove_exercise(str(self), exercise) for exercise in plan],
+            ],
+        ):
+            return "could not create the exercises in gitea"
+
+        with database:
+            for exercise, options in plan.items():
+                database.session.add(ExerciseEntity(course=str(self), creator=options.creator, name=exercise,
+                                                    start=options.start, end=options.end, points=options.points))
+                # as schedule_exercise does for new exercises
+                for kind, due in (("start", options.start), ("end", options.end)):
+                    database.session.add(JobEntity(course=str(self), exercise=exercise, kind=kind, due=due,
+                                                   finished=now if kind == "start" and exercise in started else None))
+
     def delete_exercise(self, exercise: str) -> Optional[str]:
         if self.has_exercise(exercise):
             if try_except(lambda: rocket.remove_exercise(str(self), exercise)):
@@ -452,6 +640,7 @@ class Course:
                         StudentExerciseEntity.query.delete_by(
                             course=str(self), exercise=exercise
                         )
+                        JobEntity.query.delete_by(course=str(self), exercise=exercise)
                 else:
                     return f"could not delete {exercise} in gitea"
             else:
@@ -462,10 +651,52 @@ class Course:
     def update_start_date(self, exercise: str, date: datetime):
         with database:
             self.get_exercise(exercise).start = date
+        self.schedule_exercise(exercise)
 
     def update_end_date(self, exercise: str, date: datetime):
         with database:
             self.get_exercise(exercise).end = date
+        self.schedule_exercise(exercise)
+
+    @staticmethod
+    def publishes_later(start: datetime) -> bool:
+        """
+        true if the scheduler publishes the exercise once it starts,
+        without the scheduler exercises are published right away as they are added
+        """
+        return start > datetime.now() and not Env.get_bool("DISABLE_SCHEDULER", required=False)
+
+    def schedule_exercise(self, exercise: str):
+        """
+        creates or moves the start and end events of the exercise, picked up by the scheduler
+        """
+        e = self.get_exercise(exercise)
+        now = datetime.now()
+        with database:
+            for kind, due in (("start", e.start), ("end", e.end)):
+                job = JobEntity.query.one(course=str(self), exercise=exercise, kind=kind)
+                if job is None:
+                    # exercises that already started got published when they were added,
+                    # another worker might be creating the same job (e.g. in the backfill)
+                    JobEntity.query.insert_missing({
+                        "course": str(self), "exercise": exercise, "kind": kind, "due": due, "attempts": 0,
+                        "finished": now if kind == "start" and not self.publishes_later(due) else None,
+                    })
+                elif job.due != due:
+                    job.due = due
+                    job.claimed = None
+                    job.attempts = 0
+                    job.finished = None
+
+    def publish_exercise(self, exercise: str):
+        e = self.get_exercise(exercise)
+        gitea_exercises.add_exercise(str(self), exercise, self.student_names, CreateExerciseOption(
+            creator=e.creator,
+            start=e.start,
+            end=e.end,
+            points=e.points,
+            course_name=self.entity.display_name,
+        ))
 
     def update_points(self, exercise: str, points: float):
         with database:
@@ -505,11 +736,35 @@ class Course:
             if exercise.start <= now < exercise.end
         ]
 
+    @property
+    def pending_exercise_names(self) -> list:
+        names = pending_cache.get(str(self))
+        if names is None:
+            now = datetime.now()
+            exercises = self.exercises
+            names = [exercise.name for exercise in exercises if exercise.start <= now < exercise.end]
+            transition = min([date for exercise in exercises for date in (exercise.start, exercise.end)
+                              if date > now], default=None)
+            ttl = pending_cache.ttl
+            if transition:
+                ttl = max(1, min(ttl, int((transition - now).total_seconds()) + 1))
+            pending_cache.set(str(self), names, ttl=ttl)
+        return names
+
+    def refresh_pending(self):
+        pending_cache.delete(str(self))
+        return self.pending_exercise_names
+
     @property
     def finished_exercises(self):
         now = datetime.now()
         return [exercise for exercise in self.exercises if exercise.end < now]
 
+    @property
+    def next_deadline(self) -> Optional[datetime]:
+        now = datetime.now()
+        return min([exercise.end for exercise in self.exercises if exercise.end >= now], default=None)
+
     def get_students_with_points(
         self, points: int, exercise: str, student_exercises=None
     ):
@@ -568,12 +823,14 @@ class Course:
         include_ungraded: bool = True,
         return_exercises=False,
         exercises=None,
+        student_exercises=None,
     ):
         # ugly code but less db queries ;)
         res = dict()
         if exercises is None:
             exercises = self.exercises
-        student_exercises = self.get_student_exercises(student)
+        if student_exercises is None:
+            student_exercises = self.get_student_exercises(student)
 
         def _find_student_exercise(exercise):
             m = [
@@ -655,6 +912,68 @@ class Course:
                     points=points,
                 )
 
+    def grade_no_submissions(self, exercise: str, students: list = None) -> list:
+        # grades ungraded students (of the given ones, default all) without any files in the exercise directory
+        # with 0 points, in their readme and the database, returns them
+        graded = {student_exercise.student for student_exercise in self.get_student_exercises_by_exercise(exercise)}
+        tutors = {r.student: r.tutor for r in TutorStudentEntity.query.many(course=str(self))}
+        if students is None:
+            students = self.student_names
+
+        no_submission = []
+        results = gitea_exercises.grade_no_submissions(str(self), self.entity.display_name, exercise,
+                                                       [student for student in students if student not in graded])
+        for student, result in results.items():
+            if isinstance(result, str):
+                # do not let one broken repository stop grading the others
+                send_error(Exception(result))
+            elif result:
+                no_submission += [student]
+
+        try:
+            with database:
+                database.session.add_all([
+                    StudentExerciseEntity(
+                        course=str(self),
+                        exercise=exercise,
+                        student=student,
+                        tutor=tutors.get(student, "no_tutor"),
+                        points=0,
+                    )
+                    for student in no_submission
+                ])
+        except IntegrityError:
+            # some tutor was faster
+            database.session.rollback()
+        return no_submission
+
+    # repositories
+
+    def record_push(self, student: str, head: Optional[str] = None):
+        repository = StudentRepositoryEntity.query.one(course=str(self), student=student)
+        if repository:
+            with database:
+                repository.last_push = datetime.now()
+                repository.head = head
+        else:
+            try:
+                with database as db:
+                    db += StudentRepositoryEntity(
+                        course=str(self),
+                        student=student,
+                        last_push=datetime.now(),
+                        head=head,
+                    )
+            except IntegrityError:
+                # concurrent push created it, the newer one wins anyways
+                database.session.rollback()
+
+    def get_repositories(self, since: Optional[datetime] = None):
+        query = StudentRepositoryEntity.query.filter_by(course=str(self))
+        if since:
+            query = query.filter(StudentRepositoryEntity.last_push > since)
+        return query.all()
+
     # util
 
     def __str__(self):
@@ -725,6 +1044,19 @@ class Course:
 
     @staticmethod
     def from_str(s: str) -> Optional["Course"]:
+        resolved = courses_cache.get(s.lower())
+        if resolved is not None:
+            name, semester = resolved
+            return Course(name=name, semester=semester)
+
+        c = Course.resolve(s)
+        # unknown courses are not cached, they might get created any time
+        if c:
+            courses_cache.set(s.lower(), (c.name, c.semester))
+        return c
+
+    @staticmethod
+    def resolve(s: str) -> Optional["Course"]:
         if len(s) >= 6 and "-" in s:
             s = s.split("-")
             semester = s[0]
@@ -17,6 +17,8 @@ class CourseEntity(database.Model):
 
     __table_args__ = (UniqueConstraint("name", "semester", name="_course_uc"),)
 
+    __change_keys__ = ("semester", "name")
+
     id = Column(Integer, primary_key=True)
 
     name = Column(String(122), nullable=False)
@@ -39,6 +41,8 @@ class TutorEntity(database.Model):
 
     __table_args__ = (UniqueConstraint("course", "username", name="_tutor_uc"),)
 
+    __change_keys__ = ("course", "username")
+
     id = Column(Integer, primary_key=True)
 
     course = Column(String(128), nullable=False)
@@ -53,6 +57,8 @@ class StudentEntity(database.Model):
 
     __table_args__ = (UniqueConstraint("course", "username", name="_student_uc"),)
 
+    __change_keys__ = ("course", "username")
+
     id = Column(Integer, primary_key=True)
 
     course = Column(String(128), nullable=False)
@@ -79,6 +85,8 @@ class ExerciseEntity(database.Model):
 
     __table_args__ = (UniqueConstraint("course", "name", name="_exercise_uc"),)
 
+    __change_keys__ = ("course", "name")
+
     id = Column(Integer, primary_key=True)
 
     course = Column(String(128), nullable=False)
@@ -98,6 +106,8 @@ class StudentExerciseEntity(database.Model):
         UniqueConstraint("course", "student", "exercise", name="_student_exercise_uc"),
     )
 
+    __change_keys__ = ("course", "student", "exercise")
+
     id = Column(Integer, primary_key=True)
 
     course = Column(String(128), nullable=False)
@@ -120,3 +130,39 @@ class TutorialParticipation(database.Model):
     presented = Column(Boolean, nullable=False, default=False)
 
     date = Column(DateTime, nullable=False)
+
+
+class StudentRepositoryEntity(database.Model):
+    __tablename__ = "student_repository"
+
+    __table_args__ = (UniqueConstraint("course", "student", name="_student_repository_uc"),)
+
+    id = Column(Integer, primary_key=True)
+
+    course = Column(String(128), nullable=False)
+    student = Column(String(64), nullable=False)
+
+    # updated on every push to the repository
+    last_push = Column(DateTime, nullable=False)
+    head = Column(String(64), nullable=True)
+
+
+class JobEntity(database.Model):
+    __tablename__ = "job"
+
+    # one event per exercise and kind ("start", "end"), moving a date reschedules it
+    __table_args__ = (UniqueConstraint("course", "exercise", "kind", name="_job_uc"),)
+    __change_keys__ = ("course", "exercise", "kind")
+
+    id = Column(Integer, primary_key=True)
+
+    course = Column(String(128), nullable=False)
+    exercise = Column(String(128), nullable=False)
+    kind = Column(String(64), nullable=False)
+
+    due = Column(DateTime, nullable=False)
+    # set by the worker running the job, claims older than the scheduler timeout are retried
+    claimed = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # null until the job succeeded
+    finished = Column(DateTime, nullable=True)
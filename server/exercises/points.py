@@ -0,0 +1,33 @@
+import re
+from typing import Optional, Tuple
+
+# e.g. "# exercise-01 (7.5 / 10)" in the first line of a README
+POINTS_PATTERN = re.compile(r"(\d+[,.]?\d*) */ *(\d+[,.]?\d*)")
+
+
+def parse_points(first_line: str) -> Optional[Tuple[float, float]]:
+    """
+    returns points and maximum points, None if there is not exactly one point expression
+    """
+    matches = POINTS_PATTERN.findall(first_line)
+    if len(matches) != 1:
+        return None
+    points, max_points = matches[0]
+    return float(points.replace(",", ".")), float(max_points.replace(",", "."))
+
+
+def validate_points(first_line: str, max_points: Optional[float]) -> Optional[str]:
+    """
+    returns what is wrong with the grading in the first line, None if it is fine
+    """
+    matches = POINTS_PATTERN.findall(first_line)
+    if not matches:
+        return "found no valid point schema, the first line has to contain (XX/XX) where XX are floats exactly once"
+    if len(matches) > 1:
+        return "found multiple point schemas, the first line has to contain (XX/XX) where XX are floats exactly once"
+    points, maximum = (float(value.replace(",", ".")) for value in matches[0])
+    if max_points is not None and maximum != max_points:
+        return f"maximum points {maximum:g} do not match the exercise's maximum points {max_points:g}"
+    if points > maximum:
+        return f"{points:g} points exceed the maximum points {maximum:g}"
+    return None
@@ -0,0 +1,143 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from server.database import database
+from server.env import Env
+from server.error_handling import send_error
+from server.exercises.course import Course
+from server.exercises.models import ExerciseEntity, JobEntity
+
+
+@dataclass
+class Scheduler:
+    """
+    runs the start and end events of exercises in a background thread of every worker,
+    the job table is the queue (ordered by due) and makes sure only one worker runs each event
+    """
+    # upper bound of seconds to sleep, e.g. to notice events scheduled by other nodes
+    interval: int = field(default_factory=lambda: Env.get_int("SCHEDULER_INTERVAL", required=False, default=60))
+    # events older than this are not caught up on (e.g. on first deploy)
+    max_age: timedelta = field(
+        default_factory=lambda: timedelta(days=Env.get_int("SCHEDULER_MAX_AGE_DAYS", required=False, default=7))
+    )
+    # claims older than this are considered crashed and retried
+    timeout: timedelta = field(
+        default_factory=lambda: timedelta(minutes=Env.get_int("SCHEDULER_TIMEOUT_MINUTES", required=False,
+                                                              default=30))
+    )
+    max_attempts: int = 3
+    wake: threading.Event = field(default_factory=threading.Event)
+
+    def start(self, app):
+        database.on_change(self.on_change)
+        threading.Thread(target=self.__loop, args=(app,), daemon=True).start()
+
+    def on_change(self, change: dict):
+        if change["table"] == "job":
+            self.wake.set()
+
+    def __loop(self, app):
+        try:
+            with app.app_context():
+                self.backfill()
+                database.session.remove()
+        except Exception as e:
+            send_error(e)
+
+        while True:
+            wait = self.interval
+            try:
+                with app.app_context():
+                    self.run_due()
+                    upcoming = self.upcoming()
+                    database.session.remove()
+                if upcoming:
+                    wait = min(wait, max(0, (upcoming - datetime.now()).total_seconds()))
+            except Exception as e:
+                send_error(e)
+            self.wake.wait(wait)
+            self.wake.clear()
+
+    @staticmethod
+    def backfill():
+        # exercises added before events were persisted
+        scheduled = {(job.course, job.exercise) for job in JobEntity.query.all()}
+        for exercise in ExerciseEntity.query.all():
+            if (exercise.course, exercise.name) not in scheduled:
+                course = Course.from_str(exercise.course)
+                if course:
+                    course.schedule_exercise(exercise.name)
+
+    def __runnable(self, now: datetime):
+        return JobEntity.query.filter(
+            JobEntity.finished.is_(None),
+            JobEntity.attempts < self.max_attempts,
+            or_(JobEntity.claimed.is_(None), JobEntity.claimed < now - self.timeout),
+        )
+
+    def upcoming(self):
+        job = self.__runnable(datetime.now()).order_by(JobEntity.due).first()
+        return job.due if job else None
+
+    def run_due(self):
+        now = datetime.now()
+        for job in self.__runnable(now).filter(JobEntity.due <= now).order_by(JobEntity.due).all():
+            if self.claim(job, now):
+                self.run(job)
+
+    def claim(self, job: JobEntity, now: datetime) -> bool:
+        # only one worker gets to update the row
+        claimed = self.__runnable(now).filter(JobEntity.id == job.id, JobEntity.claimed == job.claimed) \
+            .update({"claimed": now, "attempts": JobEntity.attempts + 1}, synchronize_session=False)
+        database.session.commit()
+        return claimed == 1
+
+    def run(self, job: JobEntity):
+        job_id, course_name, exercise, kind, due = job.id, job.course, job.exercise, job.kind, job.due
+        # claiming counted this attempt in the database only
+        attempts = job.attempts + 1
+        try:
+            course = Course.from_str(course_name)
+            # too old to be worth it, or the course or exercise got deleted meanwhile
+            if course and course.has_exercise(exercise) and due > datetime.now() - self.max_age:
+                course.refresh_pending()
+                if kind == "start":
+                    course.publish_exercise(exercise)
+                elif kind == "end" and exercise != "tutorial-sessions":
+                    # graded when scanning students in tutorials
+                    course.grade_no_submissions(exercise)
+            with database:
+                JobEntity.query.filter_by(id=job_id).update({"finished": datetime.now()}, synchronize_session=False)
+        except Exception as e:
+            database.session.rollback()
+            send_error(e)
+            if attempts >= self.max_attempts:
+                send_error(Exception(f"gave up on the {kind} of {exercise} in {course_name} after {attempts} attempts, "
+                                     f"retry it in the exercises of the course"))
+
+    def failed(self, course: str):
+        """
+        jobs of the course the scheduler gave up on
+        """
+        return JobEntity.query.filter(
+            JobEntity.course == course,
+            JobEntity.finished.is_(None),
+            JobEntity.attempts >= self.max_attempts,
+        ).order_by(JobEntity.due).all()
+
+    @staticmethod
+    def retry(course: str, exercise: str, kind: str) -> bool:
+        job = JobEntity.query.one(course=course, exercise=exercise, kind=kind)
+        if job is None or job.finished is not None:
+            return False
+        # the change wakes the schedulers
+        with database:
+            job.attempts = 0
+            job.claimed = None
+        return True
+
+
+scheduler = Scheduler()
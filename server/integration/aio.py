@@ -0,0 +1,300 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+import httpx
+
+from server.env import Env
+from server.util.metrics import metrics
+
+
+class Loop:
+    """
+    asyncio event loop running in a background thread of the current worker,
+    lets sync flask code run coroutines and fan out concurrently
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pid: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def __ensure(self) -> asyncio.AbstractEventLoop:
+        # threads do not survive forking into workers
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.loop = asyncio.new_event_loop()
+                    threading.Thread(target=self.loop.run_forever, daemon=True).start()
+                    self.pid = os.getpid()
+        return self.loop
+
+    def run(self, coroutine: Awaitable, timeout: float = None):
+        """
+        runs the coroutine on the loop and waits for its result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__ensure()).result(timeout)
+
+    def map(self, f: Callable[..., Awaitable], items: Iterable, concurrency: int = None) -> List:
+        """
+        runs f for all items, at most concurrency at once, returns the results in order.
+        all items are processed even if some fail, the first failure is raised afterwards
+        """
+        concurrency = concurrency or Env.get_int("ASYNC_CONCURRENCY", required=False, default=8)
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def limited(item):
+                async with semaphore:
+                    return await f(item)
+
+            return await asyncio.gather(*[limited(item) for item in items], return_exceptions=True)
+
+        results = self.run(run_all())
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+
+loop = Loop()
+
+
+class ServiceError(Exception):
+    def __init__(self, service: str, status: int, text: str):
+        super().__init__(f"{service} answered {status}: {text[:200]}")
+        self.status = status
+
+
+class AsyncService:
+    """
+    pooled async http client of an integration, created lazily on the background loop
+    """
+    name = ""
+
+    def __init__(self):
+        self.clients = {}
+
+    @property
+    def base_url(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def headers(self) -> dict:
+        return {}
+
+    @property
+    def auth(self):
+        return None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # one pool per worker and loop, connections are bound to it
+        key = (os.getpid(), id(asyncio.get_running_loop()))
+        if key not in self.clients:
+            connections = Env.get_int(f"{self.name.upper()}_CONNECTIONS", required=False, default=16)
+            self.clients[key] = httpx.AsyncClient(
+                base_url=self.base_url, headers=self.headers, auth=self.auth, timeout=30,
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            )
+        return self.clients[key]
+
+    async def request(self, method: str, path: str, ok: Iterable[int] = (), **kwargs) -> httpx.Response:
+        """
+        sends the request, raises ServiceError for error statuses not in ok
+        """
+        start = time.perf_counter()
+        status = "error"
+        try:
+            r = await self.client.request(method, path, **kwargs)
+            status = f"{r.status_code // 100}xx"
+        finally:
+            # same series as metrics.call of the sync clients
+            metrics.observe("outbound_request_duration_seconds", {"service": self.name}, time.perf_counter() - start)
+            metrics.inc("outbound_requests_total", {"service": self.name, "status": status})
+        if r.status_code >= 400 and r.status_code not in ok:
+            raise ServiceError(self.name, r.status_code, r.text)
+        return r
+
+
+class AsyncGitea(AsyncService):
+    name = "gitea"
+
+    @property
+    def base_url(self) -> str:
+        return Env.get("GITEA_LOCAL_URL") + "/api/v1"
+
+    @property
+    def auth(self):
+        return Env.get("GITEA_USERNAME"), Env.get("GITEA_PASSWORD")
+
+    async def request(self, method: str, path: str, ok: Iterable[int] = (), sudo: str = None,
+                      **kwargs) -> httpx.Response:
+        """
+        sudo acts as that user for this request only
+        """
+        if sudo:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "Sudo": sudo}
+        return await super().request(method, path, ok=ok, **kwargs)
+
+    async def org_repos(self, org: str) -> List[str]:
+        """
+        names of all repositories of the organization, gitea returns at most a page of them per request
+        """
+        limit = Env.get_int("GITEA_PAGE_SIZE", required=False, default=50)
+        names, page = [], 1
+        while True:
+            repos = (await self.request("GET", f"/orgs/{org}/repos", params={"page": page, "limit": limit})).json()
+            names += [repo["name"] for repo in repos]
+            # gitea caps limit by its MAX_RESPONSE_ITEMS, so only an empty page marks the end
+            if not repos:
+                return names
+            page += 1
+
+    async def create_file(self, owner: str, repo: str, path: str, content: str, message: str, author: str):
+        identity = {"name": author, "email": "laurel@informatik.uni-freiburg.de"}
+        # exists already
+        await self.request("POST", f"/repos/{owner}/{repo}/contents/{path}", ok=(422,), json={
+            "author": identity, "committer": identity, "message": message, "content": content,
+        })
+
+    async def create_files(self, owner: str, repo: str, files: dict, message: str, author: str):
+        """
+        creates the files (path -> base64 content) in a single commit, file by file
+        if gitea is older than 1.20 or some of them exist already
+        """
+        identity = {"name": author, "email": "laurel@informatik.uni-freiburg.de"}
+        r = await self.request("POST", f"/repos/{owner}/{repo}/contents", ok=(404, 405, 422), json={
+            "author": identity, "committer": identity, "message": message,
+            "files": [{"operation": "create", "path": path, "content": content} for path, content in files.items()],
+        })
+        if r.status_code in (404, 405, 422):
+            for path, content in files.items():
+                await self.create_file(owner, repo, path, content, message, author)
+
+    async def files(self, owner: str, repo: str) -> List[str]:
+        """
+        all file paths in the repository, a recursive tree listing is paginated too
+        """
+        files, page = [], 1
+        while True:
+            tree = (await self.request("GET", f"/repos/{owner}/{repo}/git/trees/master", params={
+                "recursive": True, "page": page, "per_page": 1000,
+            })).json()
+            files += [entry["path"] for entry in tree.get("tree") or [] if entry["type"] == "blob"]
+            if not tree.get("truncated"):
+                return files
+            page += 1
+
+    async def get_file(self, owner: str, repo: str, path: str) -> Optional[dict]:
+        """
+        contents (base64) and sha of the file, None if it does not exist
+        """
+        r = await self.request("GET", f"/repos/{owner}/{repo}/contents/{path}", ok=(404,))
+        return r.json() if r.status_code == 200 else None
+
+    async def update_file(self, owner: str, repo: str, path: str, content: str, sha: str, message: str,
+                          author: str):
+        identity = {"name": author, "email": "laurel@informatik.uni-freiburg.de"}
+        await self.request("PUT", f"/repos/{owner}/{repo}/contents/{path}", json={
+            "author": identity, "committer": identity, "message": message, "content": content, "sha": sha,
+        })
+
+    async def add_team_member(self, team: int, username: str):
+        await self.request("PUT", f"/teams/{team}/members/{username}")
+
+    async def generate_repo(self, owner: str, template: str, name: str):
+        # exists already, e.g. from an earlier attempt
+        await self.request("POST", f"/repos/{owner}/{template}/generate", ok=(409,), json={
+            "owner": owner, "name": name, "private": True, "avatar": True, "git_content": True, "git_hooks": True,
+            "description": "", "topics": False, "labels": False, "webhooks": False,
+        })
+
+    async def add_collaborator(self, owner: str, repo: str, collaborator: str, permission: str = "write",
+                               missing_ok: bool = True):
+        # 422 if there is no such user, as e.g. for template
+        await self.request("PUT", f"/repos/{owner}/{repo}/collaborators/{collaborator}",
+                           ok=(422,) if missing_ok else (), json={"permission": permission})
+
+    async def delete_collaborator(self, owner: str, repo: str, collaborator: str):
+        await self.request("DELETE", f"/repos/{owner}/{repo}/collaborators/{collaborator}", ok=(422,))
+
+    async def archive(self, owner: str, repo: str, name: str, new_owner: str = "archive"):
+        """
+        archives the repository as name and moves it to new_owner,
+        a repository renamed already (by an earlier attempt) is only moved
+        """
+        if repo != name:
+            await self.request("PATCH", f"/repos/{owner}/{repo}", json={"archived": True, "name": name})
+        await self.request("POST", f"/repos/{owner}/{name}/transfer", json={"new_owner": new_owner})
+
+
+class AsyncRocket(AsyncService):
+    name = "rocket"
+
+    def __init__(self):
+        super().__init__()
+        self.login = None
+
+    @property
+    def base_url(self) -> str:
+        return Env.get("ROCKET_URL") + "/api/v1"
+
+    async def call(self, method: str, endpoint: str, retry: bool = True, **kwargs) -> dict:
+        if self.login is None:
+            r = await self.request("POST", "/login", json={"user": Env.get("ROCKET_USER"),
+                                                         "password": Env.get("ROCKET_PASSWORD")})
+            data = r.json()["data"]
+            self.login = {"X-Auth-Token": data["authToken"], "X-User-Id": data["userId"]}
+        r = await self.request(method, f"/{endpoint}", headers=self.login, ok=(401,) if retry else (), **kwargs)
+        if r.status_code == 401:
+            # token expired, log in once again
+            self.login = None
+            return await self.call(method, endpoint, retry=False, **kwargs)
+        return r.json()
+
+
+class AsyncAuth(AsyncService):
+    name = "auth"
+
+    @property
+    def base_url(self) -> str:
+        return Env.get("AUTH_LOCAL_URL")
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": Env.get("AUTH_API_KEY")}
+
+    async def get_user_info(self, user: str) -> Optional[dict]:
+        r = await self.request("GET", f"/api/user/{user}", ok=(404,))
+        return r.json() if r.status_code == 200 else None
+
+
+class AsyncBuild(AsyncService):
+    name = "build"
+
+    @property
+    def base_url(self) -> str:
+        return Env.get("BUILD_API_URL")
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": Env.get("BUILD_API_KEY")}
+
+    async def logs(self, course: str, student: str, exercise: str) -> Optional[str]:
+        """
+        logs of the latest build, None if there is none
+        """
+        r = await self.request("GET", f"/logs/{course}/{student}/{exercise}", ok=(404,))
+        if r.status_code == 404:
+            return None
+        return r.text
+
+
+gitea = AsyncGitea()
+rocket = AsyncRocket()
+auth = AsyncAuth()
+build = AsyncBuild()
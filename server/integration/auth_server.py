@@ -1,14 +1,21 @@
-import requests
 from requests import RequestException
 
 from server.env import Env
+from server.util.cache import Cache
+from server.util.metrics import InstrumentedSession
+
+# answers of the auth server, short lived as roles might change there
+users_cache = Cache("users", ttl=Env.get_int("USERS_CACHE_TTL", required=False, default=60))
 
 
 class Auth:
+    session = InstrumentedSession("auth")
+
     @staticmethod
+    @users_cache.memoize
     def get_user_info(user: str):
         try:
-            r = requests.get(f"{Env.get('AUTH_LOCAL_URL')}/api/user/{user}", headers={
+            r = Auth.session.get(f"{Env.get('AUTH_LOCAL_URL')}/api/user/{user}", headers={
                 "Authorization": Env.get('AUTH_API_KEY')
             })
             if r.status_code != 200:
@@ -18,9 +25,10 @@ class Auth:
             return None
 
     @staticmethod
+    @users_cache.memoize
     def get_users():
         try:
-            r = requests.get(f"{Env.get('AUTH_LOCAL_URL')}/api/users", headers={
+            r = Auth.session.get(f"{Env.get('AUTH_LOCAL_URL')}/api/users", headers={
                 "Authorization": Env.get('AUTH_API_KEY')
             })
             if r.status_code == 404:
@@ -30,9 +38,10 @@ class Auth:
             return None
 
     @staticmethod
+    @users_cache.memoize
     def get_admins():
         try:
-            r = requests.get(f"{Env.get('AUTH_LOCAL_URL')}/api/admins", headers={
+            r = Auth.session.get(f"{Env.get('AUTH_LOCAL_URL')}/api/admins", headers={
                 "Authorization": Env.get('AUTH_API_KEY')
             })
             if r.status_code == 404:
@@ -1,26 +1,27 @@
-import requests
 from requests import RequestException
 
 from server.env import Env
 from server.error_handling import send_error
+from server.util.metrics import InstrumentedSession
 
 
 class Build:
-    @staticmethod
-    def build(course: str, student: str, exercise: str):
-        r = requests.get(f"{Env.get('BUILD_API_URL')}/build/{course}/{student}{f'/{exercise}' if exercise else ''}",
-                         headers={
-                             "Authorization": Env.get('BUILD_API_KEY')
-                         })
+    # reuses connections, e.g. when fetching many logs at once
+    session = InstrumentedSession("build")
+
+    def build(self, course: str, student: str, exercise: str):
+        r = self.session.get(f"{Env.get('BUILD_API_URL')}/build/{course}/{student}{f'/{exercise}' if exercise else ''}",
+                             headers={
+                                 "Authorization": Env.get('BUILD_API_KEY')
+                             })
         if r.status_code != 200:
             send_error(Exception("failed to contact build server"))
 
-    @staticmethod
-    def logs(course: str, student: str, exercise: str):
-        r = requests.get(f"{Env.get('BUILD_API_URL')}/logs/{course}/{student}/{exercise}",
-                         headers={
-                             "Authorization": Env.get('BUILD_API_KEY')
-                         })
+    def logs(self, course: str, student: str, exercise: str):
+        r = self.session.get(f"{Env.get('BUILD_API_URL')}/logs/{course}/{student}/{exercise}",
+                             headers={
+                                 "Authorization": Env.get('BUILD_API_KEY')
+                             })
         if r.status_code == 404:
             return None
         if r.status_code != 200:
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, Dict, Optional
+
+from server.env import Env
+from server.integration import aio
+from server.util.cache import Cache
+
+# progress of the last run of each operation per course, shared by all workers
+progress_cache = Cache("fanout", ttl=Env.get_int("FANOUT_PROGRESS_TTL", required=False, default=86400))
+
+
+class FanOutError(Exception):
+    pass
+
+
+@dataclass
+class Progress:
+    operation: str
+    total: int
+    done: set = field(default_factory=set)
+    # item -> error
+    failed: dict = field(default_factory=dict)
+    started: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    @property
+    def complete(self) -> bool:
+        return self.finished is not None and not self.failed
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "done": len(self.done), "complete": self.complete}
+
+
+@dataclass
+class FanOut:
+    """
+    runs an operation on many items (e.g. all repositories of a course) concurrently on the background loop
+
+    progress is kept in the shared cache, so any worker can report it. running an operation again after it
+    failed or got interrupted (e.g. the worker was killed) skips the items that were done already
+    """
+    concurrency: int = field(default_factory=lambda: Env.get_int("FANOUT_CONCURRENCY", required=False, default=16))
+    # seconds between saving the progress while running
+    interval: float = 1
+
+    def progress(self, course: str, operation: str) -> Optional[Progress]:
+        return progress_cache.get(f"progress:{operation}", course)
+
+    def progresses(self, course: str) -> Dict[str, Progress]:
+        """
+        progress of every operation run in the course, the latest last
+        """
+        progresses = {}
+        for operation in progress_cache.get("operations", course) or []:
+            progress = self.progress(course, operation)
+            if progress is not None:
+                progresses[operation] = progress
+        return progresses
+
+    def run(self, course: str, operation: str, items: list, f: Callable[[str], Awaitable]) -> Progress:
+        """
+        runs f for all items, raises FanOutError once all are processed if some of them failed
+        """
+        previous = self.progress(course, operation)
+        operations = progress_cache.get("operations", course) or []
+        progress = Progress(operation, total=len(items))
+        # another operation in between (e.g. permit after a failed restrict) may have undone the done ones
+        if previous is not None and not previous.complete and operations and operations[-1] == operation:
+            # resume, the others are retried
+            progress.done = previous.done & set(items)
+        progress_cache.set("operations", [other for other in operations if other != operation] + [operation], course)
+        progress_cache.set(f"progress:{operation}", progress, course)
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(self.concurrency)
+            saved = time.monotonic()
+
+            async def run_one(item: str):
+                nonlocal saved
+                async with semaphore:
+                    try:
+                        await f(item)
+                        progress.done.add(item)
+                    except Exception as e:
+                        progress.failed[item] = str(e)
+                if time.monotonic() - saved > self.interval:
+                    saved = time.monotonic()
+                    progress_cache.set(f"progress:{operation}", progress, course)
+
+            await asyncio.gather(*[run_one(item) for item in items if item not in progress.done])
+
+        aio.loop.run(run_all())
+        progress.finished = time.time()
+        progress_cache.set(f"progress:{operation}", progress, course)
+        if progress.failed:
+            item, error = next(iter(progress.failed.items()))
+            raise FanOutError(f"{operation} of {course} failed for {len(progress.failed)} of {progress.total} "
+                              f"items (e.g. {item}: {error}), run it again to retry them")
+        return progress
+
+
+fanout = FanOut()
@@ -1,21 +1,42 @@
 import base64
+import re
+import threading
 import time
 from dataclasses import dataclass
 
+from cachetools import LRUCache
+
 from gitea_api import Configuration, ApiClient, AdminApi, RepositoryApi, OrganizationApi, CreateOrgOption, \
     CreateRepoOption, CreateTeamOption, UserApi, GenerateRepoOption, AddCollaboratorOption, \
-    CreateUserOption, EditRepoOption, TransferRepoOption, UserSettingsOptions, EditUserOption, CreateFileOptions, \
+    CreateUserOption, EditRepoOption, TransferRepoOption, UserSettingsOptions, EditUserOption, \
     Identity, DeleteFileOptions
 from gitea_api.rest import ApiException
 
 from server.env import Env
 from server.exercises.options import CreateCourseOption, AddTutorOption, CreateExerciseOption
+from server.integration import aio
+from server.integration.fanout import fanout
+from server.util.cache import Cache
+from server.util.metrics import metrics
+
+
+class InstrumentedApiClient(ApiClient):
+    def request(self, *args, **kwargs):
+        return metrics.call("gitea", super().request, *args, **kwargs)
+
 
 gitea_exercises_configuration = Configuration()
 gitea_exercises_configuration.host = Env.get("GITEA_LOCAL_URL") + "/api/v1"
 gitea_exercises_configuration.username = Env.get("GITEA_USERNAME")
 gitea_exercises_configuration.password = Env.get("GITEA_PASSWORD")
-gitea_exercises_api_client = ApiClient(gitea_exercises_configuration)
+gitea_exercises_api_client = InstrumentedApiClient(gitea_exercises_configuration)
+
+# clients acting as a user, each sends its own sudo header instead of the shared configuration setting one
+gitea_sudo_clients = LRUCache(maxsize=Env.get_int("GITEA_SUDO_CLIENTS", required=False, default=16))
+gitea_sudo_lock = threading.Lock()
+
+# team name -> team id (scope is the course), teams only change with the course
+teams_cache = Cache("teams", ttl=Env.get_int("TEAMS_CACHE_TTL", required=False, default=3600))
 
 
 @dataclass
@@ -27,6 +48,7 @@ class GiteaExercises:
 
     # course
     def add_course(self, course: str, options: CreateCourseOption):
+        teams_cache.invalidate(course)
         # create organization
         self.admin_api.admin_create_org(username=options.owner, body=CreateOrgOption(
             description="",
@@ -74,15 +96,34 @@ class GiteaExercises:
         ))
 
     def remove_course(self, course: str):
-        # restrict access to all repos
-        self.restrict_access(course)
-        # move all repos to archive (with unique name)
+        teams_cache.invalidate(course)
         self.ensure_archive_exists()
-        # ignore if it does not exist
         try:
-            for repo in self.org_api.org_list_repos(org=course):
-                self.archive_repo(course, repo.name, ensure_archive_exists=False)
-
+            repos = self.repos(course)
+        except aio.ServiceError as e:
+            # ignore if it does not exist
+            if e.status != 404:
+                raise e
+            return
+        suffix = str(int(time.time()))
+        # original name -> current one, repositories renamed by an earlier attempt only need to be moved
+        renamed = re.compile(rf"{re.escape(course)}-(.+)-\d+")
+        names = {}
+        for repo in repos:
+            match = renamed.fullmatch(repo)
+            names[match.group(1) if match else repo] = repo
+
+        async def archive(repo: str):
+            if names[repo] != repo:
+                await aio.gitea.archive(course, names[repo], names[repo])
+                return
+            # restrict access, then move to archive (with unique name)
+            await aio.gitea.delete_collaborator(course, repo, repo)
+            await aio.gitea.archive(course, repo, f"{course}-{repo}-{suffix}")
+
+        # progress is kept by original name, so resuming skips the ones done before
+        fanout.run(course, "archive", list(names), archive)
+        try:
             # delete organization
             self.org_api.org_delete(org=course)
         except ApiException as e:
@@ -90,22 +131,15 @@ class GiteaExercises:
                 raise e
 
     def restrict_access(self, course: str):
-        for repo in self.org_api.org_list_repos(org=course):
-            try:
-                self.repo_api.repo_delete_collaborator(owner=repo.owner.login, repo=repo.name, collaborator=repo.name)
-            except ApiException as e:
-                # ignore if their is no such user, as e.g in template
-                if e.status != 422:
-                    raise e
+        fanout.run(course, "restrict", self.repos(course),
+                   lambda repo: aio.gitea.delete_collaborator(course, repo, repo))
 
     def permit_access(self, course: str):
-        for repo in self.org_api.org_list_repos(org=course):
-            try:
-                self.repo_api.repo_add_collaborator(owner=repo.owner.login, repo=repo.name, collaborator=repo.name)
-            except ApiException as e:
-                # ignore if their is no such user, as e.g in template
-                if e.status != 422:
-                    raise e
+        fanout.run(course, "permit", self.repos(course), lambda repo: aio.gitea.add_collaborator(course, repo, repo))
+
+    @staticmethod
+    def repos(course: str) -> list:
+        return aio.loop.run(aio.gitea.org_repos(course))
 
     # student
     def add_student(self, course: str, student: str):
@@ -132,6 +166,23 @@ class GiteaExercises:
                                                 permission="write"
                                             ))
 
+    def add_students(self, course: str, students: list) -> dict:
+        """
+        add_student for many students at once, returns an error per student (None if added)
+        """
+        team = self.team_id(course, "Students")
+
+        async def add(student: str):
+            try:
+                await aio.gitea.add_team_member(team, student)
+                await aio.gitea.generate_repo(course, "template", student)
+                # as add_student, a student without gitea account fails
+                await aio.gitea.add_collaborator(course, student, student, missing_ok=False)
+            except Exception as e:
+                return f"failed to create {student}'s repo in gitea: {e}"
+
+        return dict(zip(students, aio.loop.map(add, students)))
+
     def remove_student(self, course: str, student: str):
         try:
             # remove access from repo
@@ -149,12 +200,12 @@ class GiteaExercises:
     def add_tutor(self, course: str, tutor: str, options: AddTutorOption):
         self.org_api.org_add_team_member(id=self.team_id(course, "Tutors"), username=tutor)
         # make info public for tutors students
-        self.sudo(tutor, lambda: self.user_api.update_user_settings(body=UserSettingsOptions(
+        self.sudo(tutor).update_user_settings(body=UserSettingsOptions(
             description=options.description,
             full_name=options.name,
             hide_activity=False,
             hide_email=False,
-        )))
+        ))
 
     def remove_tutor(self, course: str, tutor: str):
         try:
@@ -166,34 +217,31 @@ class GiteaExercises:
 
     # exercise
     def add_exercise(self, course: str, exercise: str, students: list, options: CreateExerciseOption):
-        for student in students + ["template"]:
+        self.add_exercises(course, {exercise: options}, students)
+
+    def add_exercises(self, course: str, exercises: dict, students: list):
+        """
+        publishes the exercises (name -> options) with a single commit per repository
+        """
+        files = {}
+        for exercise, options in exercises.items():
+            files[f"{exercise}/README.md"] = base64.b64encode(f"# {exercise} (?? / {str(options.points)})"
+                                                              .encode("utf-8")).decode("utf-8")
+            files[f"{exercise}/NOTES.md"] = base64.b64encode("# Notes\n\nZeitbedarf: X.X h\n\n## Erfahrungen\n"
+                                                             "YOUR TEXT HERE".encode("utf-8")).decode("utf-8")
+        message = "Published " + ", ".join(f"'{exercise}'" for exercise in exercises)
+        author = next(iter(exercises.values())).course_name
+
+        async def publish(student: str):
             try:
-                self.repo_api.repo_create_file(owner=course, repo=student, filepath=f"{exercise}/README.md",
-                                               body=CreateFileOptions(
-                                                   author=Identity(name=options.course_name,
-                                                                   email="laurel@informatik.uni-freiburg.de"),
-                                                   committer=Identity(name=options.course_name,
-                                                                      email="laurel@informatik.uni-freiburg.de"),
-                                                   message=f"Published '{exercise}'",
-                                                   content=base64.b64encode(f"# {exercise} (?? / {str(options.points)})"
-                                                                            .encode("utf-8")).decode("utf-8")
-                                               ))
-                self.repo_api.repo_create_file(owner=course, repo=student, filepath=f"{exercise}/NOTES.md",
-                                               body=CreateFileOptions(
-                                                   author=Identity(name=options.course_name,
-                                                                   email="laurel@informatik.uni-freiburg.de"),
-                                                   committer=Identity(name=options.course_name,
-                                                                      email="laurel@informatik.uni-freiburg.de"),
-                                                   message=f"Published '{exercise}'",
-                                                   content=base64.b64encode(
-                                                       f"# Notes\n\nZeitbedarf: X.X h\n\n## Erfahrungen\nYOUR TEXT HERE"
-                                                           .encode("utf-8")).decode("utf-8")
-                                               ))
-            except ApiException as e:
-                # file existed why so ever, is okay
-                if e.status != 422 and e.status != 403:
+                await aio.gitea.create_files(course, student, files, message, author)
+            except aio.ServiceError as e:
+                # e.g. archived repository
+                if e.status != 403:
                     raise e
 
+        aio.loop.map(publish, students + ["template"])
+
     def delete_exercise(self, course: str, display_name: str, exercise: str, students: list):
         for student in students + ["template"]:
             try:
@@ -226,6 +274,36 @@ class GiteaExercises:
                 if e.status != 404 and e.status != 403 and e.status != 400:
                     raise e
 
+    def grade_no_submissions(self, course: str, display_name: str, exercise: str, students: list) -> dict:
+        """
+        replaces ?? points by 0 in the readmes of the students without any files in the exercise directory
+        (besides readme and notes), concurrently. returns per student whether they got graded, or an error
+        """
+        async def grade(student: str):
+            try:
+                files = await aio.gitea.files(course, student)
+                if any(file.startswith(f"{exercise}/") and file not in (f"{exercise}/README.md",
+                                                                        f"{exercise}/NOTES.md") for file in files):
+                    return False
+                file = await aio.gitea.get_file(course, student, f"{exercise}/README.md")
+                if file is None:
+                    return False
+                lines = base64.b64decode(file["content"].encode("utf-8")).decode("utf-8").split("\n")
+                if not re.findall(r"\?\? */ *(\d+[,.]?\d*)", lines[0]):
+                    return False
+                readme = f"{lines[0].replace('??', '0')}\n" \
+                         f"No submission.\n" \
+                         f"This exercise was graded as 'no submission' automatically.\n" \
+                         f"If you believe this is an error, contact your tutor.\n"
+                await aio.gitea.update_file(course, student, f"{exercise}/README.md",
+                                            base64.b64encode(readme.encode("utf-8")).decode("utf-8"), file["sha"],
+                                            f"Graded '{exercise}' as no submission", display_name)
+                return True
+            except Exception as e:
+                return f"failed to grade {student}'s missing submission of {exercise}: {e}"
+
+        return dict(zip(students, aio.loop.map(grade, students)))
+
     def get_readme(self, course: str, exercise: str, student: str):
         try:
             file = self.repo_api.repo_get_contents(owner=course, repo=student, filepath=f"{exercise}/README.md")
@@ -276,11 +354,16 @@ class GiteaExercises:
 
     # util
     @staticmethod
-    def sudo(user: str, f):
-        gitea_exercises_configuration.api_key["Sudo"] = user
-        r = f()
-        gitea_exercises_configuration.api_key["Sudo"] = None
-        return r
+    def sudo(user: str) -> UserApi:
+        """
+        user api acting as user, safe to use from concurrent requests
+        """
+        with gitea_sudo_lock:
+            client = gitea_sudo_clients.get(user)
+            if client is None:
+                client = InstrumentedApiClient(gitea_exercises_configuration, header_name="Sudo", header_value=user)
+                gitea_sudo_clients[user] = client
+        return UserApi(client)
 
     def make_admin(self, user):
         if self.exists_no_admin(user["sub"]):
@@ -314,11 +397,11 @@ class GiteaExercises:
         return list(map(lambda user: user.login, self.admin_api.admin_get_all_users()))
 
     def team_id(self, course: str, team: str):
-        q = list(filter(lambda t: t.name == team, self.org_api.org_list_teams(course)))
-        if q:
-            return q[0].id
-        else:
-            return None
+        teams = teams_cache.get("teams", course)
+        if teams is None or team not in teams:
+            teams = {t.name: t.id for t in self.org_api.org_list_teams(course)}
+            teams_cache.set("teams", teams, course)
+        return teams.get(team)
 
 
 gitea_exercises = GiteaExercises()
@@ -6,15 +6,23 @@ from rocketchat_API.rocketchat import RocketChat
 
 from server.env import Env
 from server.exercises.options import CreateCourseOption
+from server.integration import aio
 from server.integration.auth_server import auth
+from server.util.cache import Cache
+from server.util.metrics import InstrumentedSession
+
+# room name -> room id of the rooms of a team (scope is the course), changed only by the methods below
+rooms_cache = Cache("rooms", ttl=Env.get_int("ROOMS_CACHE_TTL", required=False, default=3600))
 
 
 @dataclass
 class Rocket:
+    session = InstrumentedSession("rocket")
 
     @property
     def api(self):
-        return RocketChat(Env.get("ROCKET_USER"), Env.get("ROCKET_PASSWORD"), server_url=Env.get("ROCKET_URL"))
+        return RocketChat(Env.get("ROCKET_USER"), Env.get("ROCKET_PASSWORD"), server_url=Env.get("ROCKET_URL"),
+                          session=self.session)
 
     def add_course(self, course: str, options: CreateCourseOption):
         uid = self.get_user_id(options.owner)
@@ -24,7 +32,8 @@ class Rocket:
             self.api.channels_add_owner(room_id=r["team"]["roomId"], user_id=uid)
         else:
             self.validate(self.api.teams_create(name=course, team_type=1, room={"readOnly": True}))
-            
+        rooms_cache.invalidate(course)
+
         for admin, info in auth.get_admins().items():
             self.add_owner(course, admin, info["name"])
 
@@ -36,6 +45,7 @@ class Rocket:
         else:
             self.validate(self.api.call_api_post("teams.delete", teamName=course),
                           ignore_failure=True)
+        rooms_cache.invalidate(course)
 
     def add_student(self, course: str, student: str):
         uid = self.get_user_id(student)
@@ -43,6 +53,24 @@ class Rocket:
             self.validate(self.api.call_api_post("teams.addMembers", teamName=course,
                                                  members=[{"userId": uid, "roles": ["member"]}]))
 
+    def add_students(self, course: str, students: list):
+        """
+        add_student for many students at once, looks up their ids concurrently and adds them in a single call
+        """
+
+        async def user_id(student: str):
+            try:
+                r = await aio.rocket.call("GET", "users.info", params={"username": student})
+            except aio.ServiceError:
+                # no rocket account (yet)
+                return None
+            return r["user"]["_id"] if r.get("success") else None
+
+        uids = [uid for uid in aio.loop.map(user_id, students) if uid]
+        if uids:
+            self.validate(self.api.call_api_post("teams.addMembers", teamName=course,
+                                                 members=[{"userId": uid, "roles": ["member"]} for uid in uids]))
+
     def remove_student(self, course: str, student: str):
         uid = self.get_user_id(student)
         if uid:
@@ -87,15 +115,29 @@ class Rocket:
         rid = self.validate(self.api.channels_create(name=name))["channel"]["_id"]
         self.validate(self.api.call_api_post("teams.addRooms", teamName=course, rooms=[rid]))
         self.validate(self.api.call_api_post("teams.updateRoom", roomId=rid, isDefault=True))
+        rooms_cache.invalidate(course)
 
     def remove_channel(self, course: str, name: str):
         rid = self.get_team_room_id(course, name)
         if rid:
             self.validate(self.api.channels_delete(room_id=rid), ignore_failure=True)
+            rooms_cache.invalidate(course)
 
     def add_exercise(self, course: str, exercise: str):
         self.add_channel(course, f"{course}-{exercise}")
 
+    def add_exercises(self, course: str, exercises: list):
+        """
+        add_exercise for many exercises at once, creates the channels concurrently and adds them in a single call
+        """
+        rids = aio.loop.map(lambda exercise: aio.rocket.call("POST", "channels.create",
+                                                             json={"name": f"{course}-{exercise}"}), exercises)
+        rids = [r["channel"]["_id"] for r in rids]
+        self.validate(self.api.call_api_post("teams.addRooms", teamName=course, rooms=rids))
+        aio.loop.map(lambda rid: aio.rocket.call("POST", "teams.updateRoom", json={"roomId": rid, "isDefault": True}),
+                     rids)
+        rooms_cache.invalidate(course)
+
     def remove_exercise(self, course: str, exercise: str):
         self.remove_channel(course, f"{course}-{exercise}")
 
@@ -110,18 +152,26 @@ class Rocket:
             raise RequestException(response.text)
         return response.json()
 
+    def get_team_rooms(self, course: str, refresh: bool = False) -> dict:
+        rooms = None if refresh else rooms_cache.get("rooms", course)
+        if rooms is None:
+            res = self.validate(self.api.call_api_get("teams.listRooms", teamName=course), ignore_failure=True)
+            if not res or "rooms" not in res:
+                # e.g. no such team (yet), ask again next time
+                return {}
+            rooms = {room["name"]: room["_id"] for room in res["rooms"]}
+            rooms_cache.set("rooms", rooms, course)
+        return rooms
+
     def get_team_room_ids(self, course: str):
-        res = self.validate(self.api.call_api_get("teams.listRooms", teamName=course), ignore_failure=True)
-        if res and "rooms" in res:
-            return [room["_id"] for room in res["rooms"]]
-        return []
+        return list(self.get_team_rooms(course).values())
 
     def get_team_room_id(self, course: str, name: str):
-        res = self.validate(self.api.call_api_get("teams.listRooms", teamName=course), ignore_failure=True)
-        if res and "rooms" in res:
-            m = [room["_id"] for room in res["rooms"] if room["name"] == name]
-            return m[0] if m else None
-        return None
+        rooms = self.get_team_rooms(course)
+        if name not in rooms:
+            # e.g. created by another node since it got cached
+            rooms = self.get_team_rooms(course, refresh=True)
+        return rooms.get(name)
 
     def get_user_id(self, username: str):
         try:
@@ -1,6 +1,8 @@
-from flask import Blueprint, redirect
+from flask import Blueprint, redirect, request, Response
 
 from server.routing.decorators import admin_route
+from server.util.exam import exam_distribution
+from server.util.metrics import metrics
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -9,3 +11,24 @@ admin_bp = Blueprint("admin", __name__)
 @admin_route
 def homepage():
     return redirect("/admin/courses")
+
+
+@admin_bp.route("/exam", methods=["POST"])
+@admin_route
+def upload_exam():
+    # either a file upload (field dist) or the json as body
+    upload = request.files.get("dist")
+    content = upload.read() if upload else request.get_data()
+    if not content:
+        return "missing info", 500
+    error = exam_distribution.upload(content)
+    if error:
+        return error, 400
+    return f"exam information of {len(exam_distribution.index)} students", 200
+
+
+@admin_bp.route("/metrics", methods=["GET"])
+@admin_route
+def prometheus_metrics():
+    # summed up over all workers
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
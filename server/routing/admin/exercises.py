@@ -7,6 +7,7 @@ from flask import Blueprint, render_template, request, redirect, session
 
 from server.exercises.course import Course
 from server.exercises.options import AddTutorOption, CreateExerciseOption
+from server.exercises.scheduler import scheduler
 from server.integration.gitea_exercises import gitea_exercises
 from server.routing.decorators import admin_route
 
@@ -21,7 +22,29 @@ def exercises(course):
         return "course not found", 404
 
     return render_template("admin/exercises.html", course=str(course),
-                           exercises=course.exercises)
+                           exercises=course.exercises, failed=scheduler.failed(str(course)))
+
+
+@admin_exercises_bp.route("/<course>/retry", methods=["POST"])
+@admin_route
+def retry(course):
+    course = Course.from_str(course)
+    if not course:
+        return "course not found", 404
+
+    # allow json requests
+    data = request.get_json(silent=True)
+
+    if not data:
+        data = request.form
+
+    if "exercise" not in data or "kind" not in data:
+        return "missing info", 500
+
+    if not scheduler.retry(str(course), data["exercise"], data["kind"]):
+        return "job not found or finished already", 404
+
+    return redirect(f"/admin/exercises/{str(course)}")
 
 
 @admin_exercises_bp.route("/<course>/add", methods=["GET", "POST"])
@@ -67,6 +90,53 @@ def add(course):
     return redirect(f"/admin/exercises/{str(course)}")
 
 
+@admin_exercises_bp.route("/<course>/import", methods=["POST"])
+@admin_route
+def import_plan(course):
+    course = Course.from_str(course)
+    if not course:
+        return "course not found", 404
+
+    # a list of exercises as in add (name, start_date, end_date, points), as json body or file upload (field plan)
+    upload = request.files.get("plan")
+    try:
+        data = json.loads(upload.read()) if upload else request.get_json(silent=True)
+    except (JSONDecodeError, UnicodeDecodeError):
+        return "plan is not valid json", 400
+    if isinstance(data, dict):
+        data = data.get("exercises")
+    if not data or not isinstance(data, list):
+        return "missing info", 500
+
+    creator = (session.get("user") or {}).get("sub", "api")
+    plan, errors = {}, []
+    for i, entry in enumerate(data):
+        if not isinstance(entry, dict) or any(key not in entry for key in ("name", "start_date", "end_date", "points")):
+            errors.append(f"exercise {i + 1} is missing info")
+            continue
+        name = str(entry["name"]).strip()
+        if name in plan:
+            errors.append(f"exercise with name {name} is in the plan twice")
+            continue
+        try:
+            start = datetime.strptime(entry["start_date"], "%Y-%m-%dT%H:%M")
+            end = datetime.strptime(entry["end_date"], "%Y-%m-%dT%H:%M")
+            points = entry["points"] if isinstance(entry["points"], (int, float)) else float(entry["points"].strip())
+            points = int(points) if float(points).is_integer() else points
+        except (ValueError, TypeError, AttributeError):
+            errors.append(f"could not parse start or end date of {name}, or points is not a number")
+            continue
+        plan[name] = CreateExerciseOption(creator=creator, start=start, end=end, points=points)
+    if errors:
+        return "\n".join(errors), 400
+
+    err = course.import_exercises(plan)
+    if err:
+        return err, 500
+
+    return redirect(f"/admin/exercises/{str(course)}")
+
+
 @admin_exercises_bp.route('/<course>/delete', methods=["POST"])
 @admin_route
 def delete(course):
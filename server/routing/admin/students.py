@@ -1,9 +1,12 @@
+import csv
+import io
 import itertools
 import json
+import re
 from datetime import datetime
 from json import JSONDecodeError
 
-from flask import Blueprint, render_template, request, redirect, session
+from flask import Blueprint, render_template, request, redirect, session, jsonify
 
 from server.exercises.course import Course
 from server.exercises.options import AddTutorOption, CreateExerciseOption
@@ -45,3 +48,37 @@ def delete(course):
         return err, 500
 
     return redirect(f"/admin/students/{str(course)}")
+
+
+@admin_students_bp.route('/<course>/enroll', methods=["POST"])
+@admin_route
+def enroll(course):
+    course = Course.from_str(course)
+    if not course:
+        return "course not found", 404
+
+    # either json {"students": [...]} or {"matrikelnummern": [...]}, a csv upload (field roster)
+    # with a matrikelnummer column (or the first column), or usernames in the form field students
+    data = request.get_json(silent=True) or {}
+    upload = request.files.get("roster")
+    if upload:
+        text = upload.read().decode("utf-8-sig")
+        # spreadsheets export with ; in some locales
+        delimiter = max(",;\t", key=text.split("\n", 1)[0].count)
+        rows = [row for row in csv.reader(io.StringIO(text), delimiter=delimiter) if row]
+        header = [cell.strip().lower() for cell in rows[0]] if rows else []
+        column = header.index("matrikelnummer") if "matrikelnummer" in header else 0
+        roster = [row[column].strip() for row in rows if len(row) > column and row[column].strip().isdigit()]
+        matrikelnummer = True
+    elif "matrikelnummern" in data:
+        roster = [str(entry) for entry in data["matrikelnummern"]]
+        matrikelnummer = True
+    else:
+        roster = data.get("students") or re.split(r"[\s,;]+", request.form.get("students", ""))
+        matrikelnummer = False
+
+    roster = list(dict.fromkeys(entry for entry in roster if entry))
+    if not roster:
+        return "missing info", 400
+
+    return jsonify(course.enroll_students(roster, matrikelnummer=matrikelnummer))
@@ -19,9 +19,9 @@ def tutors(course):
     if not course:
         return "course not found", 404
 
+    students = course.tutor_student_names
     return render_template("admin/tutors.html", course=str(course),
-                           tutors=[(tutor, course.get_tutor_student_names(tutor.username))
-                                   for tutor in course.tutors])
+                           tutors=[(tutor, students.get(tutor.username, [])) for tutor in course.tutors])
 
 
 @admin_tutors_bp.route("/<course>/add", methods=["GET", "POST"])
@@ -1,13 +1,15 @@
 # from io import BytesIO
 
+from collections import defaultdict
 from datetime import datetime
 from flask import Blueprint, jsonify, request
 
 from server.exercises.course import Course
 from server.integration.auth_server import auth
+from server.integration.fanout import fanout
 from server.util.stats import StatsTable
 
-from server.routing.decorators import admin_route
+from server.routing.decorators import admin_route, cached_route
 
 api_bp = Blueprint("api", __name__)
 
@@ -84,8 +86,28 @@ def students(course):
     return jsonify({student.username: student.to_dict() for student in course.students})
 
 
+@api_bp.route("/course/<course>/progress", methods=["GET"])
+@admin_route
+def progress(course):
+    course = Course.from_str(course)
+    if not course:
+        return "course not found", 404
+
+    # of the last archive, restrict and permit of the course, or only the one given by ?operation=
+    if "operation" in request.args:
+        p = fanout.progress(str(course), request.args["operation"])
+        if p is None:
+            return "operation never ran", 404
+        return jsonify(p.to_dict())
+    progresses = fanout.progresses(str(course))
+    if not progresses:
+        return "no operation ran", 404
+    return jsonify({operation: p.to_dict() for operation, p in progresses.items()})
+
+
 @api_bp.route("/course/<course>/exercises/stats", methods=["GET"])
 @admin_route
+@cached_route("include_ungraded")
 def stats(course):
     course = Course.from_str(course)
     if not course:
@@ -96,6 +118,10 @@ def stats(course):
 
     exercises = course.exercises
     users = auth.get_users()
+    # all at once instead of a query per student
+    student_exercises = defaultdict(list)
+    for student_exercise in course.student_exercises:
+        student_exercises[student_exercise.student].append(student_exercise)
 
     for student in course.students:
         res[student.username] = {
@@ -103,7 +129,8 @@ def stats(course):
             if student.username in users
             else None,
             **course.get_student_exercises_stats(
-                student.username, exercises=exercises, include_ungraded=include_ungraded
+                student.username, exercises=exercises, include_ungraded=include_ungraded,
+                student_exercises=student_exercises[student.username],
             ),
         }
     return jsonify(res)
@@ -111,6 +138,7 @@ def stats(course):
 
 @api_bp.route("/course/<course>/exercise/<exercise>/stats", methods=["GET"])
 @admin_route
+@cached_route("include_time_spent")
 def exercise_stats(course, exercise):
     course = Course.from_str(course)
     if not course:
@@ -128,6 +156,7 @@ def exercise_stats(course, exercise):
 
 @api_bp.route("/course/<course>/exercises/stats.md", methods=["GET"])
 @admin_route
+@cached_route()
 def exercise_tables(course):
     course = Course.from_str(course)
     if not course:
@@ -1,7 +1,15 @@
-from flask import Blueprint, session, render_template, Response, jsonify
+import gzip
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+import httpx
+from flask import Blueprint, session, render_template, Response, jsonify, request
 
 from server.env import Env
 from server.exercises.course import Course
+from server.exercises.points import validate_points
+from server.integration import aio
 from server.integration.build_server import build
 from server.routing.decorators import authorized_route
 
@@ -55,6 +63,66 @@ def logs(course, student, exercise):
     return b, 200
 
 
+@cli_bp.route("/<course>/logs", methods=["POST"])
+@authorized_route
+def bulk_logs(course):
+    # body: { "builds": [ { "student": .., "exercise": .., "etag": (optional, of the build known to the cli) }, .. ] }
+    course = Course.from_str(course)
+    if not course:
+        return "course not found", 404
+
+    user = session.get("user")
+    role = course.get_role(user["sub"], is_admin=user["role"] == "admin")
+    if role is None or role == "student":
+        return "unauthorized", 403
+
+    data = request.get_json(silent=True)
+    if not data or "builds" not in data:
+        return "missing info", 500
+
+    students = set(course.student_names)
+    exercises = {exercise.name for exercise in course.exercises}
+    # builds only run on pushes, so the last push identifies the build of every exercise
+    repositories = {repository.student: repository for repository in course.get_repositories()}
+    settled = datetime.now() - timedelta(seconds=Env.get_int("BUILD_SETTLE_SECONDS", required=False, default=600))
+
+    async def fetch(requested):
+        student, exercise = requested.get("student"), requested.get("exercise")
+        res = {"student": student, "exercise": exercise}
+        if student not in students:
+            return {**res, "status": 404, "message": f"{student} is not enrolled in {course}"}
+        if exercise not in exercises:
+            return {**res, "status": 404, "message": f"{course} does not have {exercise}"}
+        repository = repositories.get(student)
+        push = (repository.head or repository.last_push.isoformat()) if repository else ""
+        etag = hashlib.sha1(f"{exercise}:{push}".encode("utf-8")).hexdigest()
+        running = repository is not None and repository.last_push > settled
+        if not running and etag == requested.get("etag"):
+            return {**res, "status": 304, "etag": etag}
+        try:
+            b = await aio.build.logs(str(course), student, exercise)
+        except (aio.ServiceError, httpx.HTTPError) as e:
+            return {**res, "status": 502, "message": str(e) or "failed to get logs from build server"}
+        if not b:
+            return {**res, "status": 404, "message": "build not found"}
+        if running:
+            # the build of a recent push may still run, so its logs are only known by their content
+            etag = f"{etag}-{hashlib.sha1(b.encode('utf-8')).hexdigest()}"
+            if etag == requested.get("etag"):
+                return {**res, "status": 304, "etag": etag}
+        return {**res, "status": 200, "etag": etag, "build": b}
+
+    # build server requests are io bound, so fetch them side by side
+    builds = aio.loop.map(fetch, data["builds"],
+                          concurrency=Env.get_int("BUILD_LOGS_CONCURRENCY", required=False, default=8))
+
+    r = Response(response=json.dumps({"builds": builds}), status=200, mimetype="application/json")
+    if "gzip" in request.accept_encodings:
+        r.set_data(gzip.compress(r.get_data()))
+        r.headers["Content-Encoding"] = "gzip"
+    return r
+
+
 @cli_bp.route("/<course>/students")
 @authorized_route
 def students(course):
@@ -84,3 +152,114 @@ def finished_exercises(course):
         return "unauthorized", 403
 
     return jsonify([exercise.name for exercise in course.finished_exercises])
+
+
+@cli_bp.route("/<course>/changes")
+@authorized_route
+def changes(course):
+    course = Course.from_str(course)
+    if not course:
+        return "course not found", 404
+
+    user = session.get("user")
+    role = course.get_role(user["sub"], is_admin=user["role"] == "admin")
+    if role is None or role == "student":
+        return "unauthorized", 403
+
+    since = None
+    if "since" in request.args:
+        try:
+            since = datetime.fromisoformat(request.args["since"])
+        except ValueError:
+            return "could not parse since, expected iso format", 500
+
+    # taken before querying, so the cli does not miss pushes while it syncs
+    now = datetime.now()
+    students = set(course.get_tutor_student_names(user["sub"]) if role == "tutor" else course.student_names)
+    return jsonify({
+        "now": now.isoformat(),
+        "changes": {
+            repository.student: {
+                "last_push": repository.last_push.isoformat(),
+                "head": repository.head,
+            }
+            for repository in course.get_repositories(since)
+            if repository.student in students
+        }
+    })
+
+
+@cli_bp.route("/<course>/bootstrap")
+@authorized_route
+def bootstrap(course):
+    # everything the cli needs on startup in one request
+    course = Course.from_str(course)
+    if not course:
+        return "course not found", 404
+
+    user = session.get("user")
+    role = course.get_role(user["sub"], is_admin=user["role"] == "admin")
+    if role is None or role == "student":
+        return "unauthorized", 403
+
+    now = datetime.now()
+    students = course.get_tutor_student_names(user["sub"]) if role == "tutor" else course.student_names
+    assigned = set(students)
+    return jsonify({
+        "version": Env.get("CLI_VERSION"),
+        "now": now.isoformat(),
+        "students": students,
+        "finished_exercises": [
+            {
+                "name": exercise.name,
+                "points": exercise.points,
+                "start": exercise.start.isoformat(),
+                "end": exercise.end.isoformat(),
+            }
+            for exercise in course.exercises
+            if exercise.end < now
+        ],
+        "repositories": {
+            repository.student: {
+                "last_push": repository.last_push.isoformat(),
+                "head": repository.head,
+            }
+            for repository in course.get_repositories()
+            if repository.student in assigned
+        },
+    })
+
+
+@cli_bp.route("/<course>/validate", methods=["POST"])
+@authorized_route
+def validate(course):
+    # body: { "readmes": [ { "student": .., "exercise": .., "line": (first line of the README) }, .. ] }
+    course = Course.from_str(course)
+    if not course:
+        return "course not found", 404
+
+    user = session.get("user")
+    role = course.get_role(user["sub"], is_admin=user["role"] == "admin")
+    if role is None or role == "student":
+        return "unauthorized", 403
+
+    data = request.get_json(silent=True)
+    if not data or "readmes" not in data:
+        return "missing info", 500
+
+    students = set(course.student_names)
+    max_points = {exercise.name: exercise.points for exercise in course.exercises}
+
+    errors = []
+    for readme in data["readmes"]:
+        student, exercise = readme.get("student"), readme.get("exercise")
+        if student not in students:
+            message = f"{student} is not enrolled in {course}"
+        elif exercise not in max_points:
+            message = f"{course} does not have {exercise}"
+        else:
+            message = validate_points(readme.get("line", ""), max_points[exercise])
+        if message:
+            errors += [{"student": student, "exercise": exercise, "message": message}]
+
+    return jsonify({"errors": errors})
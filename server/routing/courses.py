@@ -1,5 +1,4 @@
 from datetime import datetime
-import json
 
 from flask import (
     Blueprint,
@@ -19,6 +18,7 @@ from server.integration.gitea_exercises import gitea_exercises
 from server.routing.auth import cors
 from server.routing.decorators import authorized_route
 from server.database import database
+from server.util.exam import exam_distribution
 
 courses_bp = Blueprint("courses", __name__)
 
@@ -28,8 +28,7 @@ courses_bp = Blueprint("courses", __name__)
 def exam(course):
     user = session.get("user")
     matnr = user["matrikelnummer"]
-    with open("/app/templates/exam/dist.json", "r") as f:
-        return render_template("exam/exam.html", info=json.load(f).get(str(matnr)))
+    return render_template("exam/exam.html", info=exam_distribution.get(matnr))
 
 
 @courses_bp.route("/list", methods=["GET"])
@@ -45,20 +44,18 @@ def list_courses():
         gitea_exercises.make_admin(user)
         # drone.make_admin(username)
 
-    return cors(
-        jsonify(
-            {
-                str(course): {
-                    "role": course.get_role(username, is_admin=role == "admin"),
-                    "open": course.is_open,
-                    "restricted": course.is_restricted,
-                    "display_name": course.entity.display_name,
-                    "website": course.entity.website,
-                }
-                for course in Course.all_courses()
-            }
-        )
-    )
+    courses = {}
+    for course in Course.all_courses():
+        # every access to entity is a query
+        entity = course.entity
+        courses[str(course)] = {
+            "role": course.get_role(username, is_admin=role == "admin"),
+            "open": entity.open,
+            "restricted": entity.restricted,
+            "display_name": entity.display_name,
+            "website": entity.website,
+        }
+    return cors(jsonify(courses))
 
 
 @courses_bp.route("/<course>/<student>/tutor", methods=["GET"])
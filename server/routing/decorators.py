@@ -1,9 +1,13 @@
 import functools
+import hashlib
+from datetime import datetime
 
-from flask import session, request, redirect
+from flask import session, request, redirect, make_response, Response
 
 from server.env import Env
+from server.exercises.course import Course
 from server.routing.auth import cors
+from server.util.cache import stats_cache, CachedResponse
 
 
 def authorized_route(f):
@@ -28,3 +32,51 @@ def admin_route(f):
         return f(*args, **kws)
 
     return decorated_function
+
+
+def cache_key(name: str, flags=(), **kws) -> str:
+    """
+    key of a cached_route response, by view name, view arguments and the query flags set
+    """
+    return ":".join([name, *[f"{k}={v}" for k, v in sorted(kws.items())], *flags])
+
+
+def cached_route(*flags):
+    """
+    serves responses of course routes from the stats cache, keyed by
+    view arguments and the given query flags, answers matching If-None-Match with 304
+    """
+
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated_function(course, **kws):
+            c = Course.from_str(course)
+            if not c:
+                return f(course, **kws)
+
+            key = cache_key(f.__name__, [flag for flag in flags if flag in request.args], **kws)
+
+            entry = stats_cache.get(key, scope=str(c))
+            if entry is None:
+                r = make_response(f(course, **kws))
+                if r.status_code != 200:
+                    return r
+                body = r.get_data()
+                entry = CachedResponse(body=body, mimetype=r.mimetype, etag=hashlib.sha1(body).hexdigest())
+                # stats change when a deadline passes, even without any writes
+                deadline = c.next_deadline
+                ttl = stats_cache.ttl
+                if deadline:
+                    ttl = max(1, min(ttl, int((deadline - datetime.now()).total_seconds()) + 1))
+                stats_cache.set(key, entry, scope=str(c), ttl=ttl)
+
+            if request.if_none_match.contains(entry.etag):
+                r = Response(status=304)
+            else:
+                r = Response(response=entry.body, status=200, mimetype=entry.mimetype)
+            r.set_etag(entry.etag)
+            return r
+
+        return decorated_function
+
+    return decorator
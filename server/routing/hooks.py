@@ -1,14 +1,18 @@
 import json
-import re
 
 from flask import Blueprint, request
 
+from server.env import Env
 from server.error_handling import send_error
 from server.exercises.course import Course
+from server.exercises.points import parse_points
 from server.integration.auth_server import auth
 from server.integration.build_server import build
 from server.integration.gitea_exercises import gitea_exercises
 from server.integration.rocket_chat import rocket
+from server.routing.decorators import cache_key
+from server.util.cache import stats_cache
+from server.util.recording import hook_recorder
 
 hooks_bp = Blueprint("hooks", __name__)
 
@@ -17,6 +21,7 @@ hooks_bp = Blueprint("hooks", __name__)
 def pre_receive():
     RED = "\033[0;31m"
     RESET = "\033[0m"
+    hook_recorder.record("pre-receive", request.get_data(as_text=True))
     try:
         data = json.loads(request.get_data().decode("utf-8").replace("\n", ","))
     except:
@@ -38,7 +43,7 @@ def pre_receive():
 
     # student pushes, check access
     if username == repo:
-        pending = [exercise.name for exercise in course.pending_exercises]
+        pending = course.pending_exercise_names
 
         # wildcard
         if "*" in pending:
@@ -74,6 +79,7 @@ You need to make sure that none of the above files are affected by *any* of the
 
 @hooks_bp.route("/gitea-post-receive", methods=["POST"])
 def post_receive():
+    hook_recorder.record("post-receive", request.get_data(as_text=True))
     try:
         data = json.loads(request.get_data().decode("utf-8").replace("\n", ","))
     except:
@@ -96,6 +102,18 @@ def post_receive():
     if not course.has_student(repo):
         return "", 200
 
+    # lets tutors only sync repositories that changed (head is only sent by newer hook scripts)
+    course.record_push(repo, data.get("head"))
+
+    # the time spent is read from the notes, which are not in the database
+    for exercise in {file.split("/")[0] for file in files if file.lower().endswith("/notes.md")}:
+        stats_cache.delete(cache_key("exercise_stats", ["include_time_spent"], exercise=exercise), scope=str(course))
+        stats_cache.delete(cache_key("exercise_tables"), scope=str(course))
+
+    # e.g. no submission grading, which already wrote the points
+    if username == Env.get("GITEA_USERNAME"):
+        return "", 200
+
     role = course.get_role(username)
 
     if role is None:
@@ -106,9 +124,9 @@ def post_receive():
     if role == "student":
         if repo == username:
             edited = [path[0] for path in paths if path]
-            for exercise in course.pending_exercises:
-                if exercise.name in edited:
-                    build.build(str(course), repo, exercise.name)
+            for exercise in course.pending_exercise_names:
+                if exercise in edited:
+                    build.build(str(course), repo, exercise)
     else:
         for path in paths:
             if len(path) == 2 and path[-1].strip().lower() == "readme.md":
@@ -119,14 +137,12 @@ def post_receive():
                 if not readme:
                     send_error(Exception(f"README file of student {path} is in invalid format or deleted."))
                     continue
-                first_line = readme.split("\n")[0]
-                matches = re.findall(r"(\d+[,.]?\d*) */ *(\d+[,.]?\d*)", first_line)
+                parsed = parse_points(readme.split("\n")[0])
                 # no or too many point expressions
-                if not matches or len(matches) > 1:
+                if not parsed:
                     continue
 
-                match = matches[0]
-                points, _ = float(match[0].replace(",", ".")), float(match[1].replace(",", "."))
+                points, _ = parsed
                 course.set_points(exercise.name, repo, username, points)
 
     return "", 200
@@ -0,0 +1,120 @@
+import multiprocessing
+from dataclasses import dataclass
+from typing import Optional
+
+from flask import request, Response
+
+from server.env import Env
+from server.util.metrics import metrics
+
+try:
+    import uwsgi
+except ImportError:
+    # e.g. flask run, a single process without limits
+    uwsgi = None
+
+
+@dataclass
+class Lane:
+    """
+    a class of requests with its own concurrency limit across all workers
+    """
+    id: int
+    name: str
+    # workers handling requests of this lane at once
+    limit: int
+    # seconds shed requests are told to wait before trying again
+    retry_after: int
+    # shed right away if the uwsgi listen queue is longer than this, 0 never
+    backlog: int
+
+    @staticmethod
+    def from_env(id: int, name: str, limit: int, retry_after: int, backlog: int) -> "Lane":
+        prefix = f"ADMISSION_{name.upper()}"
+        return Lane(id, name,
+                    limit=Env.get_int(f"{prefix}_LIMIT", required=False, default=limit),
+                    retry_after=Env.get_int(f"{prefix}_RETRY_AFTER", required=False, default=retry_after),
+                    backlog=Env.get_int(f"{prefix}_BACKLOG", required=False, default=backlog))
+
+
+class Admission:
+    """
+    keeps slow admin and bulk routes from occupying all workers, so hooks (blocking git push) stay fast
+
+    every uwsgi worker owns a slot in shared memory telling which lane it is handling,
+    respawned workers take over the slot of killed ones, so nothing leaks. hooks are always admitted,
+    the other lanes never occupy the workers reserved for hooks. requests of a full lane are shed
+    right away instead of holding a worker while they wait
+    """
+
+    def __init__(self, processes: int = None):
+        if processes is None:
+            processes = uwsgi.numproc if uwsgi else 1
+        self.reserve = Env.get_int("ADMISSION_HOOKS_RESERVE", required=False, default=max(1, processes // 4))
+        self.student = Lane.from_env(1, "student", limit=processes - self.reserve, retry_after=5, backlog=64)
+        self.admin = Lane.from_env(2, "admin", limit=max(1, processes // 4), retry_after=10, backlog=16)
+        # e.g. build logs of all students of a tutor at once
+        self.bulk = Lane.from_env(3, "bulk", limit=max(1, processes // 8), retry_after=10, backlog=16)
+        self.processes = processes
+        # seconds to wait for the lock, a worker killed while holding it must not block all others
+        self.lock_timeout = Env.get_int("ADMISSION_LOCK_TIMEOUT", required=False, default=1)
+        # created before uwsgi forks the workers, so all of them share it (indexed by worker id, from 1)
+        self.slots = multiprocessing.Array("i", processes + 1, lock=False)
+        self.lock = multiprocessing.Lock()
+
+    def classify(self) -> Optional[Lane]:
+        if request.blueprint == "hooks":
+            return None
+        if request.endpoint in BULK_ENDPOINTS:
+            return self.bulk
+        if request.blueprint == "api" or (request.blueprint or "").startswith("admin"):
+            return self.admin
+        return self.student
+
+    def count(self, *lanes: Lane) -> int:
+        ids = {lane.id for lane in lanes}
+        return sum(1 for slot in self.slots if slot in ids)
+
+    def admit(self, lane: Lane, slot: int = None) -> bool:
+        if slot is None:
+            slot = uwsgi.worker_id()
+        if lane.backlog and uwsgi is not None and getattr(uwsgi, "listen_queue", lambda: 0)() > lane.backlog:
+            return False
+
+        if not self.lock.acquire(timeout=self.lock_timeout):
+            return False
+        try:
+            if self.count(self.student, self.admin, self.bulk) >= self.processes - self.reserve:
+                return False
+            if self.count(lane) >= lane.limit:
+                return False
+            self.slots[slot] = lane.id
+            return True
+        finally:
+            self.lock.release()
+
+    def release(self, slot: int = None):
+        self.slots[uwsgi.worker_id() if slot is None else slot] = 0
+
+    def init_app(self, app):
+        if uwsgi is None or Env.get_bool("ADMISSION_DISABLED", required=False):
+            return
+
+        @app.before_request
+        def admit_request():
+            lane = self.classify()
+            if lane is not None and not self.admit(lane):
+                metrics.inc("http_requests_shed_total", {"lane": lane.name})
+                r = Response(f"server is busy with {lane.name} requests, try again later", status=503)
+                r.headers["Retry-After"] = str(lane.retry_after)
+                return r
+
+        @app.teardown_request
+        def release_request(_):
+            self.release()
+
+
+# routes of the cli answering for many students at once
+BULK_ENDPOINTS = ("cli.bulk_logs",)
+
+admission = Admission()
@@ -0,0 +1,221 @@
+import functools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from cachetools import LRUCache
+
+from server.env import Env
+from server.util.metrics import metrics
+
+
+class CacheBackend:
+    """
+    byte store shared by all caches, implementations decide
+    how far the entries are shared (process, host, ...)
+    """
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: int = 0):
+        """
+        stores value for ttl seconds, 0 means until evicted
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class LocalBackend(CacheBackend):
+    """
+    plain lru cache living in the current process
+    """
+
+    def __init__(self, max_items: int):
+        self.__items = LRUCache(maxsize=max_items)
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.__lock:
+            entry = self.__items.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and expires < time.time():
+                del self.__items[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int = 0):
+        with self.__lock:
+            self.__items[key] = (time.time() + ttl if ttl else 0, value)
+
+    def delete(self, key: str):
+        with self.__lock:
+            self.__items.pop(key, None)
+
+
+class UwsgiBackend(CacheBackend):
+    """
+    uwsgi cache framework, shared by all workers of the master
+    (see --cache2 in Dockerfile, eviction is done by uwsgi via purge_lru)
+    """
+
+    def __init__(self, name: str):
+        import uwsgi
+        self.__uwsgi = uwsgi
+        self.__name = name
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.__uwsgi.cache_get(key, self.__name)
+
+    def set(self, key: str, value: bytes, ttl: int = 0):
+        self.__uwsgi.cache_update(key, value, ttl, self.__name)
+
+    def delete(self, key: str):
+        self.__uwsgi.cache_del(key, self.__name)
+
+
+class SqliteBackend(CacheBackend):
+    """
+    sqlite file shared by all processes on this host, evicts least recently used entries
+    """
+
+    def __init__(self, path: str, max_items: int):
+        self.__path = path
+        self.__max_items = max_items
+        self.__local = threading.local()
+        self.__writes = 0
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # connections must not be shared across forked workers or threads
+        if getattr(self.__local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.__path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS cache "
+                               "(key TEXT PRIMARY KEY, value BLOB, expires REAL, used REAL)")
+            self.__local.connection = connection
+            self.__local.pid = os.getpid()
+        return self.__local.connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        row = self.connection.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires and expires < now:
+            self.delete(key)
+            return None
+        self.connection.execute("UPDATE cache SET used = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key: str, value: bytes, ttl: int = 0):
+        now = time.time()
+        self.connection.execute("INSERT OR REPLACE INTO cache (key, value, expires, used) VALUES (?, ?, ?, ?)",
+                                (key, value, now + ttl if ttl else 0, now))
+        # evicting on every write would count the whole table each time
+        self.__writes += 1
+        if self.__writes % 100 == 0:
+            self.connection.execute("DELETE FROM cache WHERE key IN "
+                                    "(SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                                    (self.__max_items,))
+
+    def delete(self, key: str):
+        self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+def create_backend() -> CacheBackend:
+    kind = Env.get("CACHE_BACKEND", "auto", required=False)
+    max_items = Env.get_int("CACHE_MAX_ITEMS", required=False, default=10000)
+
+    if kind in ("auto", "uwsgi"):
+        try:
+            return UwsgiBackend(Env.get("CACHE_UWSGI_NAME", "courses", required=False))
+        except ImportError:
+            # not running inside uwsgi (e.g. flask run)
+            if kind == "uwsgi":
+                raise
+    if kind == "sqlite":
+        return SqliteBackend(Env.get("CACHE_SQLITE_PATH", "/tmp/courses-server-cache.sqlite", required=False),
+                             max_items)
+    return LocalBackend(max_items)
+
+
+backend = create_backend()
+
+
+@dataclass
+class Cache:
+    """
+    namespaced view on the shared backend
+
+    keys live in scopes (e.g. a course), invalidating a scope replaces its generation token in the backend,
+    which makes all workers sharing the backend miss on the old entries
+    """
+    namespace: str
+    ttl: int = 0
+
+    def __generation(self, scope: str) -> str:
+        key = f"{self.namespace}/{scope}/generation"
+        generation = backend.get(key)
+        if generation is None:
+            # also happens if the token got evicted, so never fall back to an old one
+            generation = uuid.uuid4().hex.encode("utf-8")
+            backend.set(key, generation)
+        return generation.decode("utf-8")
+
+    def __key(self, key: str, scope: str) -> str:
+        return f"{self.namespace}/{scope}/{self.__generation(scope)}/{key}"
+
+    def get(self, key: str, scope: str = ""):
+        value = backend.get(self.__key(key, scope))
+        if value is None:
+            metrics.inc("cache_requests_total", {"cache": self.namespace, "result": "miss"})
+            return None
+        metrics.inc("cache_requests_total", {"cache": self.namespace, "result": "hit"})
+        return pickle.loads(value)
+
+    def set(self, key: str, value, scope: str = "", ttl: int = None):
+        backend.set(self.__key(key, scope), pickle.dumps(value), self.ttl if ttl is None else ttl)
+
+    def delete(self, key: str, scope: str = ""):
+        backend.delete(self.__key(key, scope))
+
+    def invalidate(self, scope: str = ""):
+        backend.set(f"{self.namespace}/{scope}/generation", uuid.uuid4().hex.encode("utf-8"))
+
+    def memoize(self, f):
+        """
+        caches non None results of f by its arguments
+        """
+
+        @functools.wraps(f)
+        def decorated_function(*args):
+            key = f"{f.__name__}:{':'.join(map(str, args))}"
+            value = self.get(key)
+            if value is None:
+                value = f(*args)
+                if value is not None:
+                    self.set(key, value)
+            return value
+
+        return decorated_function
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    mimetype: str
+    etag: str
+
+
+stats_cache = Cache("stats", ttl=Env.get_int("STATS_CACHE_TTL", required=False, default=300))
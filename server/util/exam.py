@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from server.env import Env
+
+
+@dataclass
+class ExamDistribution:
+    """
+    rooms and times of the exam by matrikelnummer, read from the json file at path
+    and only read again once another worker (or someone else) replaced the file
+
+    uploads are written to path, which has to be writable by the workers,
+    until the first upload the file shipped at fallback (if any) is served
+    """
+    path: str
+    fallback: Optional[str] = None
+    index: dict = field(default_factory=dict)
+    # (path, mtime, size) of the file the index was read from
+    version: Optional[tuple] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def get(self, matrikelnummer):
+        self.__refresh()
+        return self.index.get(str(matrikelnummer))
+
+    def __refresh(self):
+        for path in filter(None, (self.path, self.fallback)):
+            try:
+                stat = os.stat(path)
+                break
+            except FileNotFoundError:
+                continue
+        else:
+            self.index, self.version = {}, None
+            return
+        version = (path, stat.st_mtime_ns, stat.st_size)
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            try:
+                with open(path, "r") as f:
+                    index = json.load(f)
+            except ValueError:
+                # edited by hand and broken, keep serving the last good one
+                index = self.index
+            # swap both at once, readers never see a half built index
+            self.index, self.version = index, version
+
+    @staticmethod
+    def validate(data) -> Optional[str]:
+        if not isinstance(data, dict):
+            return "expected an object of matrikelnummer to exam information"
+        for matrikelnummer, info in data.items():
+            if not matrikelnummer.strip().isdigit():
+                return f"{matrikelnummer} is not a matrikelnummer"
+            # shown as is, e.g. a string or an object of room and time
+            if info is None or info == "" or info == {} or info == []:
+                return f"exam information of {matrikelnummer} is empty"
+
+    def upload(self, content: bytes) -> Optional[str]:
+        try:
+            data = json.loads(content)
+        except ValueError as e:
+            return f"invalid json: {e}"
+        error = self.validate(data)
+        if error:
+            return error
+
+        index = {matrikelnummer.strip(): info for matrikelnummer, info in data.items()}
+        # replacing is atomic, other workers either read the old or the new file
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path)
+        except OSError:
+            os.unlink(tmp)
+            raise
+        with self.lock:
+            stat = os.stat(self.path)
+            self.index, self.version = index, (self.path, stat.st_mtime_ns, stat.st_size)
+
+
+# the workers run as www-data, which cannot write to /app
+exam_distribution = ExamDistribution(
+    os.path.join(Env.get("EXAM_DIR", "/tmp/courses-server-exam", required=False), "dist.json"),
+    fallback=Env.get("EXAM_DIST_PATH", "/app/templates/exam/dist.json", required=False),
+)
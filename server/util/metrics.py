@@ -0,0 +1,183 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+
+import requests
+from flask import g, request
+
+from server.database import database
+from server.env import Env
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500)
+
+
+@dataclass
+class Metrics:
+    """
+    counters and histograms in prometheus text format
+
+    every worker keeps its own values and writes them to a file in directory from time to time,
+    rendering sums up the files of all workers
+    """
+    directory: str
+    # seconds between writes of a worker
+    interval: int = 5
+    counters: dict = field(default_factory=dict)
+    histograms: dict = field(default_factory=dict)
+    buckets: dict = field(default_factory=dict)
+    flushed: float = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def inc(self, name: str, labels: dict, value: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: dict, value: float, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.buckets[name] = buckets
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # one count per bucket, then sum and count
+                histogram = self.histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def call(self, service: str, f, *args, **kwargs):
+        """
+        calls f, recording its latency and status as outbound request to service
+        """
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = f(*args, **kwargs)
+            status = getattr(result, "status_code", getattr(result, "status", 200))
+            return result
+        except Exception as e:
+            # e.g. ApiException of gitea
+            status = getattr(e, "status", None) or "error"
+            raise
+        finally:
+            if status != "error":
+                status = f"{int(status) // 100}xx"
+            self.observe("outbound_request_duration_seconds", {"service": service}, time.perf_counter() - start)
+            self.inc("outbound_requests_total", {"service": service, "status": status})
+
+    def init_app(self, app):
+        # values of workers of a previous run, but not of the workers running
+        # next to this one (e.g. apps loaded lazily in every uwsgi worker)
+        if not self.in_worker():
+            shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+        @app.before_request
+        def start_timer():
+            g.metrics_start = time.perf_counter()
+
+        @app.after_request
+        def record_request(response):
+            if "metrics_start" not in g:
+                return response
+            labels = {"blueprint": request.blueprint or "", "endpoint": request.endpoint or ""}
+            self.observe("http_request_duration_seconds",
+                         {**labels, "method": request.method, "status": str(response.status_code)},
+                         time.perf_counter() - g.metrics_start)
+            self.observe("http_request_queries", labels, database.queries, buckets=QUERY_BUCKETS)
+            self.observe("http_request_database_seconds", labels, database.query_log.time)
+            self.flush()
+            return response
+
+    @staticmethod
+    def in_worker() -> bool:
+        try:
+            import uwsgi
+        except ImportError:
+            # e.g. flask run, a single process
+            return False
+        return uwsgi.worker_id() > 0
+
+    def flush(self, force: bool = False):
+        if not force and time.time() - self.flushed < self.interval:
+            return
+        self.flushed = time.time()
+        with self.lock:
+            content = pickle.dumps((dict(self.counters), {key: list(value) for key, value in self.histograms.items()},
+                                    dict(self.buckets)))
+        # replaced atomically, readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, os.path.join(self.directory, f"{os.getpid()}.pickle"))
+
+    def collect(self):
+        counters, histograms, buckets = {}, {}, {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pickle"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    worker_counters, worker_histograms, worker_buckets = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+            buckets.update(worker_buckets)
+            for key, value in worker_counters.items():
+                counters[key] = counters.get(key, 0) + value
+            for key, value in worker_histograms.items():
+                if key in histograms:
+                    histograms[key] = [a + b for a, b in zip(histograms[key], value)]
+                else:
+                    histograms[key] = value
+        return counters, histograms, buckets
+
+    def render(self) -> str:
+        self.flush(force=True)
+        counters, histograms, buckets = self.collect()
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (_, labels), value in sorted(item for item in counters.items() if item[0][0] == name):
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (_, labels), values in sorted(item for item in histograms.items() if item[0][0] == name):
+                for bound, count in zip(buckets[name], values):
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {count}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+                lines.append(f"{name}_sum{format_labels(labels)} {values[-2]}")
+                lines.append(f"{name}_count{format_labels(labels)} {values[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = [(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for key, value in labels]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class InstrumentedSession(requests.Session):
+    """
+    requests session recording every request as outbound request to service
+    """
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def request(self, *args, **kwargs):
+        return metrics.call(self.service, super().request, *args, **kwargs)
+
+
+metrics = Metrics(Env.get("METRICS_DIR", "/tmp/courses-server-metrics", required=False),
+                  interval=Env.get_int("METRICS_INTERVAL", required=False, default=5))
@@ -0,0 +1,115 @@
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from server.env import Env
+
+# file names deciding whether a push is rejected, kept when anonymizing
+KEPT_FILES = ("readme.md", "notes.md", ".drone.yml")
+
+
+def pseudonym(value: str, salt: str, prefix: str) -> str:
+    return f"{prefix}-{hashlib.sha256(f'{salt}:{value}'.encode('utf-8')).hexdigest()[:10]}"
+
+
+def format_payload(data: dict) -> str:
+    # one key per line, as sent by the gitea hook scripts
+    return "{" + "\n".join(f"{json.dumps(key)}: {json.dumps(value)}" for key, value in data.items()) + "}"
+
+
+def anonymize(payload: str, salt: str) -> str:
+    """
+    replaces users, repositories, heads and file names of a hook payload by stable pseudonyms,
+    keeping the course, exercise directories and the names the hooks check for
+    """
+    data = json.loads(payload.replace("\n", ","))
+    for key in ("user", "repo"):
+        if key in data:
+            data[key] = pseudonym(data[key], salt, "user")
+    if "head" in data:
+        data["head"] = hashlib.sha1(f"{salt}:{data['head']}".encode("utf-8")).hexdigest()
+    if "files" in data:
+        files = []
+        for file in [file for file in data["files"].split(",") if file]:
+            path = file.split("/")
+            for i in range(1, len(path)):
+                if path[i].strip().lower() in KEPT_FILES:
+                    continue
+                extension = os.path.splitext(path[i])[1] if i == len(path) - 1 else ""
+                path[i] = pseudonym(path[i], salt, "file") + extension
+            files.append("/".join(path))
+        data["files"] = ",".join(files)
+    return format_payload(data)
+
+
+@dataclass
+class HookRecorder:
+    """
+    appends raw hook payloads with their arrival time as json lines to path, for replaying them later,
+    written by a background thread of each worker, so hooks do not wait for the disk
+    """
+    path: Optional[str] = field(default_factory=lambda: Env.get("HOOK_RECORD_PATH", required=False))
+    anonymize: bool = field(default_factory=lambda: Env.get_bool("HOOK_RECORD_ANONYMIZE", required=False))
+    salt: str = field(default_factory=lambda: Env.get("HOOK_RECORD_SALT", "", required=False))
+    lines: queue.Queue = field(default_factory=queue.Queue)
+    # process the writer runs in, threads do not survive forking workers
+    pid: Optional[int] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record(self, hook: str, payload: str):
+        if not self.path:
+            return
+        self.__start()
+        # anonymized by the writer too, it hashes every name of the payload
+        self.lines.put((time.time(), hook, payload))
+
+    def __start(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.lines = queue.Queue()
+            threading.Thread(target=self.__write, daemon=True).start()
+            atexit.register(self.flush)
+            self.pid = os.getpid()
+
+    def __write(self):
+        while True:
+            records = [self.lines.get()]
+            # whatever arrived meanwhile goes into the same write
+            while not self.lines.empty():
+                records.append(self.lines.get_nowait())
+            self.__append(records)
+            for _ in records:
+                self.lines.task_done()
+
+    def __append(self, records: list):
+        lines = []
+        for at, hook, payload in records:
+            if self.anonymize:
+                try:
+                    payload = anonymize(payload, self.salt)
+                except ValueError:
+                    # the hook rejects it anyway, nothing worth keeping
+                    continue
+            lines.append(json.dumps({"time": at, "hook": hook, "payload": payload}) + "\n")
+        # a single write of whole lines, appends of all workers do not interleave
+        with open(self.path, "a") as f:
+            f.write("".join(lines))
+
+    def flush(self):
+        """
+        waits until everything recorded so far is written
+        """
+        if self.pid == os.getpid():
+            self.lines.join()
+
+
+hook_recorder = HookRecorder()
@@ -8,7 +8,9 @@ import re
 import subprocess
 import sys
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass, field
+from datetime import datetime
 from getpass import getpass
 from shutil import rmtree
 
@@ -89,6 +91,36 @@ class Store:
             f.write(json.dumps(self.__body))
 
 
+# ---------------------------------------------------------------------------------------------------------------------
+
+# BUILD CACHE
+
+# file based cache of downloaded build logs, so they are only downloaded again if they changed
+
+# ---------------------------------------------------------------------------------------------------------------------
+
+@dataclass
+class BuildCache:
+    __directory: str = ".cli.builds"
+
+    def __path(self, student: str, exercise: str):
+        return f"{self.__directory}/{student}/{exercise}.json"
+
+    def __getitem__(self, item):
+        # returns { "etag": .., "build": .. } or None if build was never downloaded
+        student, exercise = item
+        if not os.path.isfile(self.__path(student, exercise)):
+            return None
+        with open(self.__path(student, exercise), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def __setitem__(self, key, value):
+        student, exercise = key
+        os.makedirs(f"{self.__directory}/{student}", exist_ok=True)
+        with open(self.__path(student, exercise), "w", encoding="utf-8") as f:
+            f.write(json.dumps(value))
+
+
 # ---------------------------------------------------------------------------------------------------------------------
 
 # API
@@ -150,6 +182,15 @@ class Session:
             print("Please contact server administrator")
             exit(1)
 
+    def post(self, url, body):
+        try:
+            return self.__session.post(url, json=body)
+        except requests.RequestException as e:
+            print(f"{url} seems to be offline.")
+            print(f"Server responded with: {e}")
+            print("Please contact server administrator")
+            exit(1)
+
 
 # ---------------------------------------------------------------------------------------------------------------------
 
@@ -195,53 +236,122 @@ class Session:
 
 @dataclass
 class Git:
+    # number of repositories worked on at the same time
+    jobs: int = 1
 
     @staticmethod
-    def __exec(command):
-        print(command)
-        # combines stderr and stdout
-        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True,
-                                 encoding="utf-8")
-        if process.returncode != 0:
-            print(f"Failed to execute {command}: {process.stdout}")
+    def __exec(commands):
+        # runs commands one after another in one repository, stops at the first failing one
+        log = []
+        stdout = ""
+        for command in commands:
+            # combines stderr and stdout
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True,
+                                     encoding="utf-8")
+            stdout = process.stdout
+            log += [f"$ {command}"] + [f"  {line}" for line in stdout.splitlines() if line.strip()]
+            if process.returncode != 0:
+                return False, log, stdout
+        return True, log, stdout
+
+    def __for_each_repository(self, commands, students=None):
+        # applies the commands returned for each student to their repositories (default: all),
+        # returns the last output of each
+        outputs = {}
+        failed = []
+        if students is None:
+            students = course.students
+        with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as pool:
+            futures = {pool.submit(self.__exec, commands(student)): student for student in students}
+            for future in as_completed(futures):
+                student = futures[future]
+                success, log, stdout = future.result()
+                print(f"[{student}] {'done' if success else 'FAILED'}")
+                print("\n".join(log))
+                if success:
+                    outputs[student] = stdout
+                else:
+                    failed += [student]
+        if failed:
+            print(f"Failed for the repositories of: {', '.join(sorted(failed))}")
             print(f"Please make sure you have access to all repositories by adding SSH key to Gitea.")
             print(f"Also run this command again to make sure all repositories have this command applied.")
             print(f"Before rerunning the command you can commit all changes by running ./cli.py -c 'Commit changes'")
             exit(1)
-        return process.stdout
-
-    def pull(self):
-        for student in course.students:
-            if not os.path.isdir(f"{COURSE}/{student}"):
-                self.__exec(f"git clone {GIT_SSH}/{COURSE}/{student}.git {COURSE}/{student}")
-            else:
-                self.__exec(f"git -C {COURSE}/{student} pull --rebase --autostash")
+        return outputs
+
+    def pull(self, sparse: bool = False, changed: set = None, widen: bool = True):
+        # changed: students whose repositories got pushed to since the last pull, None to pull all
+        # widen: whether exercises finished since the last pull
+
+        # tutors only ever need the directories of finished exercises
+        directories = " ".join(course.finished_exercises)
+
+        def needs_pull(student):
+            repository = f"{COURSE}/{student}"
+            if changed is None or student in changed or not os.path.isdir(repository):
+                return True
+            return widen and os.path.isfile(f"{repository}/.git/info/sparse-checkout")
+
+        def commands(student):
+            repository = f"{COURSE}/{student}"
+            if not os.path.isdir(repository):
+                if sparse:
+                    # no history and only root files + finished exercises
+                    clone = [f"git clone --depth 1 --filter=blob:none --sparse {GIT_SSH}/{COURSE}/{student}.git {repository}"]
+                    # a sparse clone has the root files only already, set needs at least one directory
+                    if not directories:
+                        return clone
+                    return clone + [f"git -C {repository} sparse-checkout set {directories}"]
+                return [f"git clone {GIT_SSH}/{COURSE}/{student}.git {repository}"]
+            if directories and os.path.isfile(f"{repository}/.git/info/sparse-checkout"):
+                # widen sparse checkouts as soon as new exercises are finished
+                return [
+                    f"git -C {repository} sparse-checkout set {directories}",
+                    f"git -C {repository} pull --rebase --autostash"
+                ]
+            return [f"git -C {repository} pull --rebase --autostash"]
+
+        students = [student for student in course.students if needs_pull(student)]
+        if len(students) < len(course.students):
+            print(f"Skipping {len(course.students) - len(students)} repositories without changes since the last pull.")
+        self.__for_each_repository(commands, students)
 
     def commit(self, commit_message):
-        for student in course.students:
+        def commands(student):
             work_dir = f"-C {COURSE}/{student}"
-            # only add readmes
-            self.__exec(f"cd {COURSE}/{student} && git add */README.md")
-            # commit changes (if there are any)
-            self.__exec(f'git {work_dir} diff-index --quiet HEAD || git {work_dir} commit -m "{commit_message}"')
+            return [
+                # only add readmes
+                f"cd {COURSE}/{student} && git add */README.md",
+                # commit changes (if there are any)
+                f'git {work_dir} diff-index --quiet HEAD || git {work_dir} commit -m "{commit_message}"'
+            ]
+
+        self.__for_each_repository(commands)
 
     def push(self):
         # make sure to call commit before this or changes are lost
-        for student in course.students:
+        def commands(student):
             work_dir = f"-C {COURSE}/{student}"
-            # reset to student changes (if he pushed while you corrected exercises)
-            self.__exec(f"git {work_dir} reset --hard")
-            # pull updates & re-apply changes
-            self.__exec(f"git {work_dir} pull --rebase")
-            # push changes
-            self.__exec(f"git {work_dir} push")
+            return [
+                # reset to student changes (if he pushed while you corrected exercises)
+                f"git {work_dir} reset --hard",
+                # pull updates & re-apply changes
+                f"git {work_dir} pull --rebase",
+                # push changes
+                f"git {work_dir} push"
+            ]
+
+        self.__for_each_repository(commands)
 
     @property
     def modified(self):
-        # returns all modified files in all repos as path
+        # returns all files in all repos that differ from the remote as path, committed or not
+        outputs = self.__for_each_repository(
+            lambda student: [f"git -C {COURSE}/{student} --no-pager diff --name-only remotes/origin/HEAD"]
+        )
         modified = []
-        for student in course.students:
-            stdout = self.__exec(f"git -C {COURSE}/{student} --no-pager diff --name-only master remotes/origin/HEAD")
+        for student, stdout in outputs.items():
             modified.extend([f"{COURSE}/{student}/{path.strip()}" for path in stdout.split("\n") if path])
         return modified
 
@@ -257,6 +367,7 @@ class Git:
 
 @dataclass
 class Course:
+    __bootstrap: dict = None
     __students: list = None
     __finished_exercises: list = None
     __logs: dict = field(default_factory=lambda: {})
@@ -267,8 +378,24 @@ class Course:
                f"Students: {', '.join(self.students)}\n" \
                f"Finished exercises: {', '.join(self.finished_exercises)}"
 
+    @property
+    def bootstrap(self):
+        # students, finished exercises, repositories and version in one request,
+        # empty if the server does not support it (yet)
+        if self.__bootstrap is None:
+            r = session.get(f"{CLI_API_URL}/{COURSE}/bootstrap")
+            if r.status_code == 200:
+                self.__bootstrap = json.loads(r.text)
+                if self.__bootstrap["version"] != VERSION:
+                    print("There is a newer version of this CLI, please download it again.")
+            else:
+                self.__bootstrap = {}
+        return self.__bootstrap
+
     @property
     def students(self):
+        if self.__students is None and self.bootstrap:
+            self.__students = self.bootstrap["students"]
         if self.__students is None:
             r = session.get(f"{CLI_API_URL}/{COURSE}/students")
             if r.status_code != 200:
@@ -281,6 +408,8 @@ class Course:
 
     @property
     def finished_exercises(self):
+        if self.__finished_exercises is None and self.bootstrap:
+            self.__finished_exercises = [exercise["name"] for exercise in self.bootstrap["finished_exercises"]]
         if self.__finished_exercises is None:
             r = session.get(f"{CLI_API_URL}/{COURSE}/finished_exercises")
             if r.status_code != 200:
@@ -291,11 +420,15 @@ class Course:
             self.__finished_exercises = json.loads(r.text)
         return self.__finished_exercises
 
-    def pull(self):
+    def pull(self, sparse: bool = False, full: bool = False):
         # remove all repos of people you are not tutoring anymore (if there are any)
         self.clean()
-        # pull rebase all changes
-        git.pull()
+        # pull rebase all changes (of repositories that changed since the last pull)
+        now, changed = self.get_changes()
+        git.pull(sparse, None if full else changed, widen=store["FINISHED_EXERCISES"] != self.finished_exercises)
+        if now:
+            store["LAST_SYNC"] = now
+        store["FINISHED_EXERCISES"] = self.finished_exercises
         # insert 0P for people with no files in the exercise directory
         self.grade_no_submission()
         # append build logs to all readmes
@@ -303,16 +436,39 @@ class Course:
 
         print("Done.")
 
-    def push(self, commit_message: str):
+    def push(self, commit_message: str, force: bool = False):
+        # validate no student was forgot to grade, before committing so nothing is left behind
+        errors = self.validate_readmes()
+        for path, message in errors:
+            print(f"Invalid grading in {path}: {message}")
+        if errors and not force:
+            print("Nothing was committed or pushed. Fix the READMEs above and push again (or use --force).")
+            exit(1)
         # commit changes
         git.commit(commit_message)
-        # validate no student was forgot to grade
-        self.validate_readmes()
         # push changes (with reset and pull rebase)
         git.push()
 
         print("Done.")
 
+    def get_changes(self):
+        # returns server time and the students whose repositories got pushed to since the last pull
+        # (None if unknown, e.g. on first pull)
+        last_sync = store["LAST_SYNC"]
+        if self.bootstrap:
+            if not last_sync:
+                return self.bootstrap["now"], None
+            return self.bootstrap["now"], {
+                student for student, repository in self.bootstrap["repositories"].items()
+                if datetime.fromisoformat(repository["last_push"]) > datetime.fromisoformat(last_sync)
+            }
+        r = session.get(f"{CLI_API_URL}/{COURSE}/changes{f'?since={last_sync}' if last_sync else ''}")
+        if r.status_code != 200:
+            # server does not track changes (yet)
+            return None, None
+        body = json.loads(r.text)
+        return body["now"], set(body["changes"].keys()) if last_sync else None
+
     @staticmethod
     def commit(commit_message: str):
         git.commit(commit_message)
@@ -331,8 +487,16 @@ class Course:
                 for repository in obsolete_repositories:
                     rmtree(f"{COURSE}/{repository}")
 
+    @staticmethod
+    def parse_build(text: str):
+        build = json.loads(text)
+        return {
+            "failure": build["failure"],
+            "logs": json.loads(build["logs"])
+        }
+
     def get_build(self, student: str, exercise: str):
-        if self.__logs.get((student, exercise)) is None:
+        if (student, exercise) not in self.__logs:
             r = session.get(f"{CLI_API_URL}/{COURSE}/logs/{student}/{exercise}")
             if r.status_code == 404:
                 self.__logs[(student, exercise)] = None
@@ -342,14 +506,41 @@ class Course:
                 print("Please contact server administrator.")
                 exit(1)
             else:
-                build = json.loads(r.text)
-                self.__logs[(student, exercise)] = {
-                    "failure": build["failure"],
-                    "logs": json.loads(build["logs"])
-                }
+                self.__logs[(student, exercise)] = self.parse_build(r.text)
         return self.__logs[(student, exercise)]
 
+    def fetch_builds(self, keys: list):
+        # gets many builds in one request, builds already downloaded before are only sent again if they changed
+        if not keys:
+            return
+        r = session.post(f"{CLI_API_URL}/{COURSE}/logs", {"builds": [
+            {"student": student, "exercise": exercise, "etag": (builds[(student, exercise)] or {}).get("etag")}
+            for student, exercise in keys
+        ]})
+        if r.status_code != 200:
+            # server does not support bulk requests (yet), get_build falls back to single requests
+            return
+        for b in r.json()["builds"]:
+            key = (b["student"], b["exercise"])
+            if b["status"] == 200:
+                builds[key] = {"etag": b["etag"], "build": b["build"]}
+                self.__logs[key] = self.parse_build(b["build"])
+            elif b["status"] == 304:
+                self.__logs[key] = self.parse_build(builds[key]["build"])
+            elif b["status"] == 404:
+                self.__logs[key] = None
+
     def append_builds(self):
+        missing = []
+        for student in self.students:
+            for exercise in self.finished_exercises:
+                readme_path = f"{COURSE}/{student}/{exercise}/README.md"
+                if exercise != "tutorial-sessions" and os.path.isfile(readme_path):
+                    with open(readme_path, "r", encoding="utf-8") as readme:
+                        if not any(["## Build" in line for line in readme.readlines()]):
+                            missing += [(student, exercise)]
+        self.fetch_builds(missing)
+
         for student in self.students:
             for exercise in self.finished_exercises:
                 if exercise == "tutorial-sessions":
@@ -396,6 +587,8 @@ class Course:
                                     readme.write("If you believe this is an error, contact your tutor.\n")
 
     def validate_readmes(self):
+        # returns the errors found in graded readmes, as (path, message)
+        readmes = []
         for path in git.modified:
             elements = path.split("/")
             if len(elements) != 4 or elements[-1].lower() != "readme.md" \
@@ -403,13 +596,31 @@ class Course:
                 continue
 
             with open(path, "r", encoding="utf-8") as readme:
-                matches = re.findall(r"(\d+[,.]?\d*) */ *(\d+[,.]?\d*)", readme.readline())
-                if len(matches) == 0:
-                    print(f"Found no valid point schema in {path}")
-                    print(f"Make sure the first line contains this: (XX/XX) where XX are floats exactly once.")
-                if len(matches) > 1:
-                    print(f"Found multiple valid point schema in {path}")
-                    print(f"Make sure the first line contains this: (XX/XX) where XX are floats exactly once.")
+                readmes += [(path, elements[1], elements[2], readme.readline())]
+
+        if not readmes:
+            return []
+
+        # validated server side against the exercises maximum points in one request
+        r = session.post(f"{CLI_API_URL}/{COURSE}/validate", {"readmes": [
+            {"student": student, "exercise": exercise, "line": line} for _, student, exercise, line in readmes
+        ]})
+        if r.status_code == 200:
+            paths = {(student, exercise): path for path, student, exercise, _ in readmes}
+            return [(paths[(error["student"], error["exercise"])], error["message"])
+                    for error in json.loads(r.text)["errors"]]
+
+        # server does not support validation (yet), at least check the point schema
+        errors = []
+        for path, _, _, line in readmes:
+            matches = re.findall(r"(\d+[,.]?\d*) */ *(\d+[,.]?\d*)", line)
+            if len(matches) == 0:
+                errors += [(path, "found no valid point schema, "
+                                  "the first line has to contain (XX/XX) where XX are floats exactly once")]
+            if len(matches) > 1:
+                errors += [(path, "found multiple point schemas, "
+                                  "the first line has to contain (XX/XX) where XX are floats exactly once")]
+        return errors
 
 
 # ---------------------------------------------------------------------------------------------------------------------
@@ -438,19 +649,36 @@ class Args:
                                  "(use this when something fails while pulling, so that you can run pull again"
                                  "normally push will take care of committing)",
                             type=str)
+        parser.add_argument("--sparse",
+                            help="clone new repositories shallow and only check out finished exercises "
+                                 "(saves time and disk space, sparse repositories widen automatically on pull)",
+                            action="store_true")
+        parser.add_argument("-f", "--force",
+                            help="push even if the grading in some READMEs is invalid",
+                            action="store_true")
+        parser.add_argument("--full",
+                            help="pull all repositories, not only the ones pushed to since the last pull",
+                            action="store_true")
         parser.add_argument("-i", "--info", action="store_true")
+        parser.add_argument("-j", "--jobs",
+                            help="number of repositories to run git commands on at the same time (default: 1)",
+                            type=int, default=1)
 
         self.__args = parser.parse_args()
 
+    @property
+    def jobs(self):
+        return self.__args.jobs
+
     def apply(self):
         if self.__args.info:
             print(repr(course))
         elif self.__args.pull:
-            course.pull()
+            course.pull(self.__args.sparse, self.__args.full)
         elif self.__args.commit:
             course.commit(self.__args.commit)
         elif self.__args.push:
-            course.push(self.__args.push)
+            course.push(self.__args.push, self.__args.force)
         else:
             print("No valid argument passed.")
             print("Use --help for help.")
@@ -467,6 +695,9 @@ if __name__ == '__main__':
     # create cli store where authentication token is stored
     store = Store()
 
+    # downloaded build logs
+    builds = BuildCache()
+
     # session which will ensure you are authorized after it's creation
     session = Session()  # uses: store
 
@@ -474,7 +705,7 @@ if __name__ == '__main__':
     # Updater()  # uses: session
 
     # git command line wrapper
-    git = Git()
+    git = Git(jobs=args.jobs)  # uses: args
 
     # actual logic and communicating with courses server
     course = Course()  # uses: session, git
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from fakes.directory import Directory
+from fakes.serve import serve, server_env
+
+
+@pytest.fixture(scope="session")
+def app():
+    """
+    the server against the fake services and an in-memory database
+    """
+    os.environ.update(serve(Directory(students=50), port=int(os.getenv("FAKES_PORT", 9700))))
+    for key, value in server_env("sqlite://").items():
+        os.environ.setdefault(key, value)
+    # the server reads its environment on import
+    from server.app import create_app
+
+    app = create_app()
+    # creates the tables and starts listening for changes
+    with app.app_context():
+        app.try_trigger_before_first_request_functions()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,102 @@
+import base64
+import os
+from datetime import datetime, timedelta
+
+import requests
+
+from fakes.directory import Directory
+
+
+def gitea_api() -> str:
+    return f"{os.environ['GITEA_LOCAL_URL']}/api/v1"
+
+
+def seed_course(course: str, students: int, exercises: int = 3, ended: bool = True):
+    """
+    the course, its exercises, students and their grades in the database only, call in an app context
+    """
+    from server.database import database
+    from server.exercises.models import CourseEntity, ExerciseEntity, StudentEntity, StudentExerciseEntity
+
+    semester, name = course.split("-")
+    now = datetime.now()
+    start, end = (now - timedelta(days=14), now - timedelta(days=7)) if ended else (now, now + timedelta(days=7))
+    with database:
+        database.session.add(CourseEntity(name=name, semester=semester, owner="admin", display_name=name))
+        for i in range(exercises):
+            database.session.add(ExerciseEntity(course=course, creator="admin", name=f"exercise-{i:02d}",
+                                                start=start, end=end, points=10))
+        for i in range(students):
+            student = Directory.student(i)
+            database.session.add(StudentEntity(course=course, username=student, name=student,
+                                               email=f"{student}@fake"))
+            for j in range(exercises):
+                database.session.add(StudentExerciseEntity(course=course, exercise=f"exercise-{j:02d}",
+                                                           student=student, tutor=Directory.tutor(0), points=j))
+
+
+def create_repo(org: str, repo: str, files: dict):
+    """
+    the repository (and its organization) in the fake gitea, with the given files
+    """
+    requests.post(f"{gitea_api()}/admin/users/admin/orgs", json={"username": org})
+    requests.post(f"{gitea_api()}/orgs/{org}/repos", json={"name": repo})
+    for path, content in files.items():
+        write_file(org, repo, path, content)
+
+
+def write_file(org: str, repo: str, path: str, content: str):
+    url = f"{gitea_api()}/repos/{org}/{repo}/contents/{path}"
+    existing = requests.get(url)
+    encoded = base64.b64encode(content.encode("utf-8")).decode("utf-8")
+    if existing.status_code == 200:
+        requests.put(url, json={"content": encoded, "sha": existing.json()["sha"]})
+    else:
+        requests.post(url, json={"content": encoded})
+
+
+def read_file(org: str, repo: str, path: str) -> str:
+    r = requests.get(f"{gitea_api()}/repos/{org}/{repo}/contents/{path}")
+    return base64.b64decode(r.json()["content"]).decode("utf-8")
+
+
+def login(client, username: str = "admin", role: str = "admin"):
+    with client.session_transaction() as session:
+        session["user"] = {"sub": username, "role": role}
+
+
+def build_requests() -> int:
+    from server.util.metrics import metrics
+
+    return sum(value for (name, labels), value in metrics.counters.items()
+               if name == "outbound_requests_total" and ("service", "build") in labels)
+
+
+def rocket_api() -> str:
+    return f"{os.environ['ROCKET_URL']}/api/v1"
+
+
+def create_course_services(course: str):
+    """
+    the organization with its teams and template in the fake gitea and the team in the fake rocket,
+    as add_course creates them
+    """
+    requests.post(f"{gitea_api()}/admin/users/admin/orgs", json={"username": course})
+    for team in ("Students", "Tutors"):
+        requests.post(f"{gitea_api()}/orgs/{course}/teams", json={"name": team})
+    requests.post(f"{gitea_api()}/orgs/{course}/repos", json={"name": "template", "template": True, "auto_init": True})
+    requests.post(f"{rocket_api()}/teams.create", json={"name": course, "type": 1})
+
+
+def rocket_members(course: str) -> list:
+    r = requests.get(f"{rocket_api()}/teams.members", params={"teamName": course})
+    return sorted(member["user"]["username"] for member in r.json()["members"])
+
+
+def repo_exists(org: str, repo: str) -> bool:
+    return requests.get(f"{gitea_api()}/repos/{org}/{repo}/git/trees/master").status_code == 200
+
+
+def rocket_rooms(course: str) -> list:
+    r = requests.get(f"{rocket_api()}/teams.listRooms", params={"teamName": course})
+    return sorted(room["name"] for room in r.json()["rooms"])
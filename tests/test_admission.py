@@ -0,0 +1,44 @@
+from server.util.admission import Admission
+
+
+def test_full_lanes_are_shed_without_waiting():
+    admission = Admission(processes=8)
+    # two workers reserved for hooks, at most two of the others for admin routes
+    assert admission.admit(admission.admin, slot=1)
+    assert admission.admit(admission.admin, slot=2)
+    assert not admission.admit(admission.admin, slot=3)
+
+    assert admission.admit(admission.student, slot=3)
+    assert admission.admit(admission.student, slot=4)
+    assert admission.admit(admission.student, slot=5)
+    assert admission.admit(admission.student, slot=6)
+    # the rest is reserved for hooks
+    assert not admission.admit(admission.student, slot=7)
+
+    admission.release(slot=1)
+    assert admission.admit(admission.admin, slot=7)
+
+
+def test_held_lock_sheds_instead_of_blocking():
+    admission = Admission(processes=8)
+    admission.lock_timeout = 0.01
+    # e.g. a worker got killed while holding it
+    admission.lock.acquire()
+    assert not admission.admit(admission.student, slot=1)
+
+
+def test_bulk_cli_routes_have_their_own_lane(app):
+    admission = Admission(processes=8)
+    lanes = {}
+    for method, path in (("POST", "/cli/2022WS-Test/logs"), ("GET", "/cli/2022WS-Test/students"),
+                         ("GET", "/api/course/2022WS-Test/exercises/stats"), ("POST", "/hooks/gitea-post-receive")):
+        with app.test_request_context(path, method=method):
+            lane = admission.classify()
+            lanes[path] = lane.name if lane else None
+
+    assert lanes == {
+        "/cli/2022WS-Test/logs": "bulk",
+        "/cli/2022WS-Test/students": "student",
+        "/api/course/2022WS-Test/exercises/stats": "admin",
+        "/hooks/gitea-post-receive": None,
+    }
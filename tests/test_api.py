@@ -0,0 +1,65 @@
+from seed import create_repo, seed_course, write_file
+from server.util.recording import format_payload
+
+
+def test_stats_queries_do_not_grow_with_students(app, client):
+    from server.database import database
+
+    counts = []
+    for course, students in (("2022WS-Few", 2), ("2022WS-Many", 40)):
+        with app.app_context():
+            seed_course(course, students)
+        with database.max_queries(6) as log:
+            r = client.get(f"/api/course/{course}/exercises/stats", headers={"Authorization": "fake"})
+        assert r.status_code == 200
+        assert len(r.get_json()) == students
+        counts.append(log.count)
+
+    assert counts[0] == counts[1]
+
+
+def test_stats_are_cached_until_points_change(app, client):
+    from server.database import database
+    from server.exercises.models import StudentExerciseEntity
+
+    course = "2022WS-Cached"
+    with app.app_context():
+        seed_course(course, 2)
+    url = f"/api/course/{course}/exercises/stats"
+    first = client.get(url, headers={"Authorization": "fake"})
+    assert first.status_code == 200
+
+    with database.max_queries(1):
+        cached = client.get(url, headers={"Authorization": "fake", "If-None-Match": first.headers["ETag"]})
+    assert cached.status_code == 304
+
+    with app.app_context():
+        with database:
+            StudentExerciseEntity.query.filter_by(course=course, student="student0000").first().points = 9
+    changed = client.get(url, headers={"Authorization": "fake", "If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+
+
+def test_time_spent_is_invalidated_by_notes_pushes(app, client):
+    course = "2022WS-Notes"
+    student = "student0000"
+    with app.app_context():
+        seed_course(course, 1, exercises=1)
+    create_repo(course, student, {"exercise-00/NOTES.md": "# Notes\n\nZeitbedarf: 2 h\n"})
+    url = f"/api/course/{course}/exercise/exercise-00/stats?include_time_spent"
+
+    def time_spent():
+        r = client.get(url, headers={"Authorization": "fake"})
+        assert r.status_code == 200
+        return r.get_json()["students"][student]["time_spent"]
+
+    assert time_spent() == 2
+
+    write_file(course, student, "exercise-00/NOTES.md", "# Notes\n\nZeitbedarf: 3.5 h\n")
+    assert time_spent() == 2
+
+    payload = format_payload({"user": student, "repo": student, "owner": course,
+                              "files": "exercise-00/NOTES.md", "head": "0" * 40})
+    assert client.post("/hooks/gitea-post-receive", data=payload).status_code == 200
+    assert time_spent() == 3.5
@@ -0,0 +1,14 @@
+def test_cache_requests_are_counted(app):
+    from server.util.cache import Cache
+    from server.util.metrics import metrics
+
+    def requests(result):
+        return metrics.counters.get(("cache_requests_total", (("cache", "counted"), ("result", result))), 0)
+
+    cache = Cache("counted")
+    assert cache.get("key") is None
+    cache.set("key", 1)
+    assert cache.get("key") == 1
+
+    assert requests("miss") == 1
+    assert requests("hit") == 1
@@ -0,0 +1,43 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import requests
+
+from seed import build_requests, login, seed_course
+
+
+def test_bulk_logs_answer_unchanged_builds_without_fetching(app, client):
+    from server.database import database
+    from server.exercises.models import StudentRepositoryEntity
+
+    course = "2022WS-Logs"
+    with app.app_context():
+        seed_course(course, 2, exercises=1)
+        with database as db:
+            db += StudentRepositoryEntity(course=course, student="student0000", head="1" * 40,
+                                          last_push=datetime.now() - timedelta(hours=1))
+    requests.get(f"{os.environ['BUILD_API_URL']}/build/{course}/student0000/exercise-00")
+    login(client)
+
+    def logs(etag=None):
+        r = client.post(f"/cli/{course}/logs",
+                        json={"builds": [{"student": "student0000", "exercise": "exercise-00", "etag": etag}]})
+        assert r.status_code == 200
+        return r.get_json()["builds"][0]
+
+    first = logs()
+    assert first["status"] == 200
+    build = json.loads(first["build"])
+    assert not build["failure"]
+    assert json.loads(build["logs"])[-1]["logs"] == ["all tests passed"]
+
+    fetched = build_requests()
+    assert logs(first["etag"])["status"] == 304
+    assert build_requests() == fetched
+
+    with app.app_context():
+        from server.exercises.course import Course
+        # the build of the new push is fetched again
+        Course.from_str(course).record_push("student0000", "2" * 40)
+    assert logs(first["etag"])["status"] == 200
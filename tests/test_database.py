@@ -0,0 +1,144 @@
+import pytest
+from flask import Flask
+
+from server.database import Database, LocalBroker
+
+
+def create(name: str):
+    """
+    a database of its own app with a watched model
+    """
+    database = Database()
+
+    class Membership(database.Model):
+        __tablename__ = "membership"
+        __change_keys__ = ("course", "student")
+        id = database.alchemy.Column(database.alchemy.Integer, primary_key=True)
+        course = database.alchemy.Column(database.alchemy.String(50))
+        student = database.alchemy.Column(database.alchemy.String(50))
+        __table_args__ = (database.alchemy.UniqueConstraint("course", "student"),)
+
+    app = Flask(name)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    database.init_app(app)
+    with app.app_context():
+        database.alchemy.create_all()
+    database.listen()
+
+    changes = []
+    database.on_change(changes.append)
+    return database, app, Membership, changes
+
+
+@pytest.fixture(autouse=True)
+def broker():
+    # listeners of the databases of other tests
+    LocalBroker.listeners.clear()
+    yield
+    LocalBroker.listeners.clear()
+
+
+def test_changes_reach_every_database_once():
+    first, app, Membership, first_changes = create("first")
+    _, _, _, second_changes = create("second")
+
+    with app.app_context():
+        with first as db:
+            db += Membership(course="2022WS-Test", student="student0000")
+
+    expected = [{"table": "membership", "course": "2022WS-Test", "student": "student0000"}]
+    assert first_changes == expected
+    assert second_changes == expected
+
+
+def test_sessions_of_other_databases_are_not_watched():
+    first, _, _, first_changes = create("first")
+    second, app, Membership, second_changes = create("second")
+
+    with app.app_context():
+        with second as db:
+            db += Membership(course="2022WS-Test", student="student0000")
+
+    # the commit in the second database is published by it only, not recorded by the first
+    assert len(first_changes) == 1
+    assert len(second_changes) == 1
+
+
+def test_rollback_discards_changes():
+    database, app, Membership, changes = create("first")
+
+    with app.app_context():
+        database.session.add(Membership(course="2022WS-Test", student="student0000"))
+        database.session.flush()
+        database.session.rollback()
+        database.session.commit()
+
+    assert changes == []
+
+
+def test_bulk_deletes_are_published():
+    database, app, Membership, changes = create("first")
+
+    with app.app_context():
+        with database as db:
+            db += Membership(course="2022WS-Test", student="student0000")
+        changes.clear()
+        with database:
+            Membership.query.delete_by(course="2022WS-Test", student="student0000")
+
+    assert changes == [{"table": "membership", "course": "2022WS-Test", "student": "student0000"}]
+
+
+def test_insert_missing_skips_existing_rows():
+    database, app, Membership, changes = create("first")
+
+    with app.app_context():
+        with database as db:
+            db += Membership(course="2022WS-Test", student="student0000")
+        # as if another worker inserted it first
+        with database:
+            Membership.query.insert_missing({"course": "2022WS-Test", "student": "student0000"},
+                                            {"course": "2022WS-Test", "student": "student0001"})
+
+        assert sorted(m.student for m in Membership.query.all()) == ["student0000", "student0001"]
+
+
+def test_failed_publish_keeps_the_commit(monkeypatch):
+    database, app, Membership, changes = create("first")
+
+    def unreachable(payload):
+        raise ConnectionError("broker unreachable")
+
+    monkeypatch.setattr(database.broker, "publish", unreachable)
+    with app.app_context():
+        with database as db:
+            db += Membership(course="2022WS-Test", student="student0000")
+
+        assert [m.student for m in Membership.query.all()] == ["student0000"]
+    # own changes are handled before publishing
+    assert changes == [{"table": "membership", "course": "2022WS-Test", "student": "student0000"}]
+
+
+def test_missing_columns_are_added():
+    database, app, Membership, _ = create("first")
+
+    class Grade(database.Model):
+        __tablename__ = "grade"
+        id = database.alchemy.Column(database.alchemy.Integer, primary_key=True)
+        attempts = database.alchemy.Column(database.alchemy.Integer, nullable=False, default=0)
+        claimed = database.alchemy.Column(database.alchemy.DateTime, nullable=True)
+
+    with app.app_context():
+        # as deployed before the columns existed
+        database.session.execute(database.alchemy.text("CREATE TABLE grade (id INTEGER PRIMARY KEY)"))
+        database.session.execute(database.alchemy.text("INSERT INTO grade (id) VALUES (1)"))
+        database.session.commit()
+
+        database.add_missing_columns()
+        # and again, e.g. by the next worker
+        database.add_missing_columns()
+
+        grade = Grade.query.one(id=1)
+        assert grade.attempts == 0
+        assert grade.claimed is None
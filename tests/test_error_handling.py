@@ -0,0 +1,36 @@
+def test_duplicates_roll_back_and_undo_silently(app, monkeypatch):
+    from server import error_handling
+    from server.database import database
+    from server.exercises.models import StudentEntity
+
+    errors, undone = [], []
+    monkeypatch.setattr(error_handling, "send_error", errors.append)
+
+    def join():
+        with database as db:
+            db += StudentEntity(course="2022WS-Twice", username="student0000", name="student0000", email="s@fake")
+
+    with app.app_context():
+        assert error_handling.try_except(join, lambda: undone.append("rocket"))
+        assert not error_handling.try_except(join, lambda: undone.append("rocket"))
+
+        assert undone == ["rocket"]
+        assert errors == []
+        # the session is usable again
+        assert StudentEntity.query.filter_by(course="2022WS-Twice").count() == 1
+
+
+def test_failures_are_reported_and_undone(app, monkeypatch):
+    from server import error_handling
+
+    errors, undone = [], []
+    monkeypatch.setattr(error_handling, "send_error", errors.append)
+
+    def fail():
+        raise ConnectionError("gitea unreachable")
+
+    def fail_undoing():
+        raise ConnectionError("rocket unreachable")
+
+    assert not error_handling.try_except(fail, fail_undoing)
+    assert [str(e) for e in errors] == ["gitea unreachable", "rocket unreachable"]
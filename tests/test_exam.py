@@ -0,0 +1,17 @@
+import json
+
+
+def test_uploaded_distribution_is_shown(client):
+    # as in the dist.json files of previous exams
+    dist = {"4711": {"room": "HS 101", "time": "09:00"}, "4712": "HS 102, 11:00"}
+    r = client.post("/admin/exam", data=json.dumps(dist), headers={"Authorization": "fake"})
+    assert r.status_code == 200, r.data
+
+    with client.session_transaction() as session:
+        session["user"] = {"sub": "student0000", "role": "student", "matrikelnummer": 4711}
+    assert b"HS 101" in client.get("/courses/2022WS-Exam/exam").data
+
+
+def test_distribution_without_matrikelnummer_is_rejected(client):
+    r = client.post("/admin/exam", data=json.dumps({"someone": "HS 101"}), headers={"Authorization": "fake"})
+    assert r.status_code == 400
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from seed import create_course_services, create_repo, read_file, rocket_rooms, seed_course
+
+
+def plan(start: datetime) -> list:
+    def exercise(name, days, points=10):
+        return {"name": name, "points": points,
+                "start_date": (start + timedelta(days=days)).strftime("%Y-%m-%dT%H:%M"),
+                "end_date": (start + timedelta(days=days + 7)).strftime("%Y-%m-%dT%H:%M")}
+
+    return [exercise("exercise-01", -1), exercise("exercise-02", 6)]
+
+
+def test_imported_plan_is_published_and_scheduled(app, client, monkeypatch):
+    from server.exercises.models import ExerciseEntity, JobEntity
+
+    course = "2022WS-Plan"
+    with app.app_context():
+        seed_course(course, 1, exercises=0)
+    create_course_services(course)
+    create_repo(course, "student0000", {})
+    # publishing later is up to the scheduler
+    monkeypatch.setenv("DISABLE_SCHEDULER", "false")
+    exercises = plan(datetime.now().replace(second=0, microsecond=0))
+
+    r = client.post(f"/admin/exercises/{course}/import", json=exercises, headers={"Authorization": "fake"})
+    assert r.status_code == 302, r.data
+
+    with app.app_context():
+        assert sorted(e.name for e in ExerciseEntity.query.filter_by(course=course)) == ["exercise-01", "exercise-02"]
+        jobs = {(job.exercise, job.kind): job.finished is not None for job in JobEntity.query.filter_by(course=course)}
+    # the started one got published right away
+    assert jobs == {("exercise-01", "start"): True, ("exercise-01", "end"): False,
+                    ("exercise-02", "start"): False, ("exercise-02", "end"): False}
+    assert read_file(course, "student0000", "exercise-01/README.md").startswith("# exercise-01")
+    assert {f"{course}-exercise-01", f"{course}-exercise-02"} <= set(rocket_rooms(course))
+
+    # importing the same plan again changes nothing
+    r = client.post(f"/admin/exercises/{course}/import", json=exercises, headers={"Authorization": "fake"})
+    assert r.status_code == 302, r.data
+    with app.app_context():
+        assert ExerciseEntity.query.filter_by(course=course).count() == 2
+        assert JobEntity.query.filter_by(course=course).count() == 4
+
+    exercises[1]["points"] = 20
+    r = client.post(f"/admin/exercises/{course}/import", json=exercises, headers={"Authorization": "fake"})
+    assert r.status_code == 500
+    assert b"exercise-02 already exists with other dates or points" in r.data
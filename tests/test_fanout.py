@@ -0,0 +1,42 @@
+import pytest
+
+from seed import seed_course
+
+
+def test_progress_is_kept_per_operation_and_resumed_only_if_nothing_ran_since(app, client):
+    from server.integration.fanout import FanOut, FanOutError
+
+    fanout = FanOut()
+    course = "2022WS-FanOut"
+    with app.app_context():
+        seed_course(course, 0, exercises=0)
+    calls = []
+
+    def operation(failing=()):
+        async def f(item):
+            calls.append(item)
+            if item in failing:
+                raise ConnectionError("gitea unreachable")
+
+        return f
+
+    with pytest.raises(FanOutError):
+        fanout.run(course, "restrict", ["a", "b", "c"], operation(failing=("b",)))
+    fanout.run(course, "permit", ["a", "b", "c"], operation())
+    assert fanout.progress(course, "restrict").failed == {"b": "gitea unreachable"}
+    assert fanout.progress(course, "permit").complete
+
+    # permit undid part of the restrict, so it starts over
+    calls.clear()
+    with pytest.raises(FanOutError):
+        fanout.run(course, "restrict", ["a", "b", "c"], operation(failing=("b",)))
+    assert sorted(calls) == ["a", "b", "c"]
+    # right after its failure, only the failed ones are retried
+    calls.clear()
+    fanout.run(course, "restrict", ["a", "b", "c"], operation())
+    assert calls == ["b"]
+
+    r = client.get(f"/api/course/{course}/progress", headers={"Authorization": "fake"})
+    assert list(r.get_json()) == ["permit", "restrict"]
+    r = client.get(f"/api/course/{course}/progress?operation=permit", headers={"Authorization": "fake"})
+    assert r.get_json()["complete"]
@@ -0,0 +1,46 @@
+import requests
+
+from seed import create_repo, gitea_api, read_file
+
+
+def test_grade_no_submissions(app):
+    from server.integration.gitea_exercises import gitea_exercises
+
+    course = "2022WS-Grading"
+    create_repo(course, "student0000", {"exercise-01/README.md": "# exercise-01 (?? / 10)"})
+    create_repo(course, "student0001", {"exercise-01/README.md": "# exercise-01 (?? / 10)",
+                                        "exercise-01/main.py": "print()"})
+    create_repo(course, "student0002", {"exercise-01/README.md": "# exercise-01 (5 / 10)"})
+
+    graded = gitea_exercises.grade_no_submissions(course, "Grading", "exercise-01",
+                                                  ["student0000", "student0001", "student0002", "student0003"])
+
+    assert graded["student0000"] is True
+    assert graded["student0001"] is False
+    assert graded["student0002"] is False
+    # no repository
+    assert "failed to grade student0003" in graded["student0003"]
+    assert read_file(course, "student0000", "exercise-01/README.md").startswith("# exercise-01 (0 / 10)\nNo submission.")
+    assert read_file(course, "student0001", "exercise-01/README.md") == "# exercise-01 (?? / 10)"
+
+
+def test_remove_course_resumes_archiving(app, monkeypatch):
+    from server.integration import gitea_exercises as module
+
+    course = "2022WS-Archive"
+    api = gitea_api()
+    create_repo(course, "student0000", {})
+    create_repo(course, "student0001", {})
+    # renamed by an earlier attempt, which failed to move it
+    requests.patch(f"{api}/repos/{course}/student0000", json={"archived": True, "name": f"{course}-student0000-1"})
+    monkeypatch.setattr(module.time, "time", lambda: 2)
+
+    module.gitea_exercises.remove_course(course)
+
+    def exists(owner: str, repo: str) -> bool:
+        return requests.get(f"{api}/repos/{owner}/{repo}/git/trees/master").status_code == 200
+
+    assert exists("archive", f"{course}-student0000-1")
+    assert exists("archive", f"{course}-student0001-2")
+    assert not exists("archive", f"{course}-{course}-student0000-1-2")
+    assert module.fanout.progress(course, "archive").complete
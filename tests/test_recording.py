@@ -0,0 +1,20 @@
+import json
+
+from server.util.recording import HookRecorder, format_payload
+
+
+def test_hooks_are_recorded_in_order(tmp_path):
+    path = tmp_path / "hooks.jsonl"
+    recorder = HookRecorder(path=str(path), anonymize=True, salt="salt")
+    payload = format_payload({"user": "student0000", "repo": "student0000", "owner": "2022WS-Test",
+                              "files": "exercise-01/main.py"})
+
+    for hook in ("pre-receive", "post-receive"):
+        recorder.record(hook, payload)
+    recorder.record("post-receive", "not json")
+    recorder.flush()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["hook"] for record in records] == ["pre-receive", "post-receive"]
+    assert "student0000" not in records[0]["payload"]
+    assert "2022WS-Test" in records[0]["payload"]
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from seed import login, seed_course
+
+
+def test_failing_start_is_reported_and_retried_from_the_admin_view(app, client, monkeypatch):
+    from server.database import database
+    from server.exercises import scheduler as module
+    from server.exercises.course import Course
+    from server.exercises.models import JobEntity
+
+    course = "2022WS-Failing"
+    with app.app_context():
+        seed_course(course, 1, exercises=1)
+        with database as db:
+            db += JobEntity(course=course, exercise="exercise-00", kind="start",
+                            due=datetime.now() - timedelta(minutes=1), attempts=0)
+
+    def unreachable(self, exercise):
+        raise ConnectionError("gitea unreachable")
+
+    errors = []
+    monkeypatch.setattr(Course, "publish_exercise", unreachable)
+    monkeypatch.setattr(module, "send_error", errors.append)
+    # claims expire right away, so every run retries
+    scheduler = module.Scheduler(timeout=timedelta(0))
+
+    with app.app_context():
+        for _ in range(scheduler.max_attempts + 1):
+            scheduler.run_due()
+        assert [str(e) for e in errors].count("gitea unreachable") == scheduler.max_attempts
+        assert "gave up on the start of exercise-00" in str(errors[-1])
+
+    login(client)
+    assert b"RETRY" in client.get(f"/admin/exercises/{course}").data
+    r = client.post(f"/admin/exercises/{course}/retry", data={"exercise": "exercise-00", "kind": "start"})
+    assert r.status_code == 302
+
+    monkeypatch.undo()
+    published = []
+    monkeypatch.setattr(Course, "publish_exercise", lambda self, exercise: published.append(exercise))
+    with app.app_context():
+        scheduler.run_due()
+        assert published == ["exercise-00"]
+        assert JobEntity.query.one(course=course, exercise="exercise-00", kind="start").finished is not None
@@ -0,0 +1,91 @@
+from seed import create_course_services, repo_exists, rocket_members, seed_course
+
+
+def enroll(client, course, **kwargs):
+    return client.post(f"/admin/students/{course}/enroll", headers={"Authorization": "fake"}, **kwargs)
+
+
+def students(app, course):
+    from server.exercises.models import StudentEntity
+
+    with app.app_context():
+        return sorted(student.username for student in StudentEntity.query.filter_by(course=course))
+
+
+def test_roster_column_is_found_by_header_or_first_column(app, client):
+    from io import BytesIO
+
+    for course, roster in (
+            ("2022WS-Header", "Name,Matrikelnummer\nStudent 10,4000010\nStudent 11,4000011\n"),
+            ("2022WS-Column", "4000010;Student 10\n4000011\n"),
+    ):
+        with app.app_context():
+            seed_course(course, 0, exercises=0)
+        create_course_services(course)
+
+        r = enroll(client, course, data={"roster": (BytesIO(roster.encode("utf-8")), "roster.csv")})
+
+        assert r.status_code == 200, r.data
+        assert r.get_json() == {"4000010": None, "4000011": None}
+        assert students(app, course) == ["student0010", "student0011"]
+        assert rocket_members(course) == ["student0010", "student0011"]
+
+
+def test_missing_roster_is_rejected(app, client):
+    with app.app_context():
+        seed_course("2022WS-Empty", 0, exercises=0)
+    assert enroll(client, "2022WS-Empty", json={"students": []}).status_code == 400
+
+
+def test_failed_gitea_setup_is_undone_for_that_student_only(app, client, monkeypatch):
+    from server.integration import aio
+
+    course = "2022WS-Partial"
+    with app.app_context():
+        seed_course(course, 0, exercises=0)
+    create_course_services(course)
+
+    add_collaborator = aio.gitea.add_collaborator
+
+    async def without_account(owner, repo, collaborator, **kwargs):
+        if collaborator == "student0021":
+            raise aio.ServiceError("gitea", 422, "user does not exist")
+        return await add_collaborator(owner, repo, collaborator, **kwargs)
+
+    monkeypatch.setattr(aio.gitea, "add_collaborator", without_account)
+
+    r = enroll(client, course, json={"students": ["student0020", "student0021", "student0022"]})
+
+    report = r.get_json()
+    assert report["student0020"] is None and report["student0022"] is None
+    assert "failed to create student0021's repo in gitea" in report["student0021"]
+    assert students(app, course) == ["student0020", "student0022"]
+    assert rocket_members(course) == ["student0020", "student0022"]
+    # archived
+    assert not repo_exists(course, "student0021")
+    assert repo_exists(course, "student0020")
+
+
+def test_students_joining_meanwhile_are_not_duplicated(app, client, monkeypatch):
+    from server.database import database
+    from server.exercises.models import StudentEntity
+    from server.integration.gitea_exercises import gitea_exercises
+
+    course = "2022WS-Joining"
+    with app.app_context():
+        seed_course(course, 0, exercises=0)
+    create_course_services(course)
+
+    add_students = gitea_exercises.add_students
+
+    def join_meanwhile(course, students):
+        errors = add_students(course, students)
+        with database as db:
+            db += StudentEntity(course=course, username="student0031", name="student0031", email="s@fake")
+        return errors
+
+    monkeypatch.setattr(gitea_exercises, "add_students", join_meanwhile)
+    r = enroll(client, course, json={"students": ["student0030", "student0031", "student0032"]})
+
+    assert r.get_json() == {"student0030": None, "student0031": None, "student0032": None}
+    assert students(app, course) == ["student0030", "student0031", "student0032"]